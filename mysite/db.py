@@ -0,0 +1,13 @@
+from django.db.backends.signals import connection_created
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Run the PRAGMAS of a SQLite database's settings on each of its new connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(apply_pragmas)
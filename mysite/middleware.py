@@ -0,0 +1,152 @@
+import json
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+from .profiling import RequestTimings, current_timings, record_timing
+from .routers import RequestRouting, current_routing
+
+_log_lock = threading.Lock()
+_original_template_render = Template.render
+
+
+def _timed_execute(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_timing('db', time.perf_counter() - start)
+
+
+def _timed_template_render(self, context=None, request=None):
+    start = time.perf_counter()
+    try:
+        return _original_template_render(self, context, request)
+    finally:
+        record_timing('template', time.perf_counter() - start)
+
+
+def install_query_timer(connection):
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+# Installed on every connection rather than per request: async views run their queries on other threads,
+# which only share the request's contextvars. Outside sampled requests the timer records nothing.
+connection_created.connect(lambda sender, connection, **kwargs: install_query_timer(connection))
+for existing_connection in connections.all():
+    install_query_timer(existing_connection)
+
+def install_template_timer():
+    """Time Django template rendering; render() and render_to_string(), {% include %}s count towards their parent."""
+    Template.render = _timed_template_render
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests: wall time, DB queries, Redis calls and template rendering.
+    Sampled responses get a Server-Timing header and a line in the PROFILING['LOG_FILE'] JSONL log.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # With profiling off, Django's templates stay unpatched.
+        if settings.PROFILING['SAMPLE_RATE'] > 0:
+            install_template_timer()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.PROFILING['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            current_timings.reset(token)
+        return self.finish(request, response, timings, total)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            current_timings.reset(token)
+        return self.finish(request, response, timings, total)
+
+    def finish(self, request, response, timings, total):
+        response['Server-Timing'] = self.server_timing(timings, total)
+        self.write_log(request, response, timings, total)
+        return response
+
+    @staticmethod
+    def server_timing(timings, total):
+        metrics = [f'total;dur={total * 1000:.2f}']
+        for name in ('db', 'redis', 'template'):
+            if timings.counts[name]:
+                metrics.append(f'{name};dur={timings.seconds[name] * 1000:.2f};desc="{timings.counts[name]} calls"')
+        return ', '.join(metrics)
+
+    @staticmethod
+    def write_log(request, response, timings, total):
+        entry = {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+        }
+        for name in ('db', 'redis', 'template'):
+            entry[f'{name}_calls'] = timings.counts[name]
+            entry[f'{name}_ms'] = round(timings.seconds[name] * 1000, 3)
+        with _log_lock, open(settings.PROFILING['LOG_FILE'], 'a') as log_file:
+            log_file.write(json.dumps(entry) + '\n')
+
+
+class DatabaseRoutingMiddleware:
+    """Give each request its own replica routing state (see mysite.routers)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_routing.set(RequestRouting())
+        try:
+            return self.get_response(request)
+        finally:
+            current_routing.reset(token)
+
+    async def __acall__(self, request):
+        token = current_routing.set(RequestRouting())
+        try:
+            return await self.get_response(request)
+        finally:
+            current_routing.reset(token)
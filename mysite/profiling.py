@@ -0,0 +1,23 @@
+import contextvars
+from collections import defaultdict
+
+current_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Call counts and total seconds per kind of work ('db', 'redis', 'template') within one request."""
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.counts[name] += 1
+        self.seconds[name] += seconds
+
+
+def record_timing(name, seconds):
+    """Add to the current request's profile; a no-op outside sampled requests."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
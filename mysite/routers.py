@@ -0,0 +1,76 @@
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Routing state of the current request; None outside requests, where everything uses the primary.
+current_routing = contextvars.ContextVar('database_routing', default=None)
+
+
+class RequestRouting:
+    """
+    Whether the current request may read from replicas. Any write pins the rest of the request to the
+    primary, so it reads back what it wrote rather than a replica that may not have caught up yet.
+    """
+
+    def __init__(self):
+        self.replica_reads = False
+        self.pinned = False
+
+
+def allow_replica_reads():
+    """Let every read in the rest of the current request go to a replica, unless it has written."""
+    routing = current_routing.get()
+    if routing is not None:
+        routing.replica_reads = True
+
+
+def read_from_primary():
+    """Send every read in the rest of the current request to the primary, as if it had written."""
+    routing = current_routing.get()
+    if routing is not None:
+        routing.pinned = True
+
+
+class ReplicaRouter:
+    """
+    Send reads of REPLICA_MODELS, and all reads of requests that allow_replica_reads(), to a random alias
+    in REPLICA_DATABASES. Writes, and reads after a write in the same request, go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or routing.pinned or not settings.REPLICA_DATABASES:
+            return None
+        if routing.replica_reads or model._meta.label in settings.REPLICA_MODELS:
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replicating the primary.
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaReadMixin:
+    """Viewset mixin that reads from replicas in the actions listed in `replica_actions`."""
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        if self.action in self.replica_actions:
+            allow_replica_reads()
+        super().initial(request, *args, **kwargs)
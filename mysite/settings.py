@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mysite.middleware.ProfilingMiddleware',
+    'mysite.middleware.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,14 +77,110 @@ WSGI_APPLICATION = 'mysite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# DB_PROFILE selects 'development' (SQLite with its defaults, a new connection per request), 'production'
+# (SQLite tuned for concurrent readers and writers) or 'postgres'. PRAGMAS are run by mysite.db on every
+# new SQLite connection; WAL mode lets reads proceed while a write is in progress.
+
+DB_PROFILE = os.environ.get('DB_PROFILE', 'development')
+
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        # Seconds a statement waits for a lock before raising "database is locked".
+        'timeout': 5,
+    },
+    'PRAGMAS': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+    },
+}
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'mysite'),
+            'USER': os.environ.get('POSTGRES_USER', 'mysite'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('POSTGRES_POOLER') == 'pgbouncer':
+        # PgBouncer in transaction mode owns the pooling; server-side cursors (used by iterator())
+        # do not survive it handing each transaction to a different server connection.
+        DATABASES['default'].update(CONN_MAX_AGE=0, DISABLE_SERVER_SIDE_CURSORS=True)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+            **(SQLITE_PRODUCTION if DB_PROFILE == 'production' else {}),
+        }
+    }
+
+# Read replicas
+# DATABASE_REPLICAS is a comma separated list of replica SQLite files, or hosts with DB_PROFILE=postgres.
+# A copy of the primary's SQLite file can stand in for a replica. mysite.routers.ReplicaRouter sends reads
+# of REPLICA_MODELS, and of viewset actions using ReplicaReadMixin, to them. Writes, and reads after a
+# write in the same request, stay on the primary.
+
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    location = {'HOST': replica.strip()} if DB_PROFILE == 'postgres' else {'NAME': replica.strip()}
+    # Tests run replica queries against the test primary.
+    DATABASES[alias] = {**DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(alias)
+
+REPLICA_MODELS = ('polls.UserProfile', 'polls.Teams', 'polls.TeamMembership')
+
+DATABASE_ROUTERS = ['mysite.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory is per process; point CACHE_BACKEND at FileBasedCache (with CACHE_LOCATION as a directory)
+# to share cached directory pages and their invalidation across worker processes.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'mysite'),
     }
 }
 
 
+# Redis
+# BACKEND is 'redis' for a real server or 'memory' for the in-process stand-in.
+# Timeouts are in seconds; RETRY_AFTER is how long lookups miss after a failure.
+
+REDIS = {
+    'BACKEND': os.environ.get('REDIS_BACKEND', 'redis'),
+    'URL': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    'MAX_CONNECTIONS': 50,
+    'SOCKET_TIMEOUT': 0.2,
+    'SOCKET_CONNECT_TIMEOUT': 0.2,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'RETRY_AFTER': 5,
+}
+
+
+# Request profiling
+# SAMPLE_RATE is the fraction of requests profiled (0 disables it); sampled requests get a
+# Server-Timing header and a JSON line in LOG_FILE.
+
+PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01')),
+    'LOG_FILE': os.environ.get('PROFILING_LOG_FILE', BASE_DIR / 'profiling.jsonl'),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
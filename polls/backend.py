@@ -1,7 +1,9 @@
 import datetime
 from collections import defaultdict
 from django.contrib.auth.models import User, Group
-from django.db.models import Prefetch, Q, Func, F
+from django.db import transaction
+from django.db.models import Q, Func, F
+from django.utils.dateparse import parse_date
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.decorators import action
@@ -10,14 +12,22 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
 from automater.common_utility import get_standard_logger
 from automater.backend_utilities import BackendAPI, validate_api
-from automate.backend_utilities import get_formatted_data, copy_process_utility, check_strat_run
+from automate.backend_utilities import copy_process_utility
 from automate.models import PendingProcess, Box, Region, Strategy, TickerPlant, GenericProcess, CalenderEvents, PROCESS_MAP, KillSwitch, Currency, Teams, RegionStrategyManage, UserWatchlistConfig, ExchangeRates
 from automate.tasks import add_strategy_to_subteam
 from automate.serializers import UserSerializer, GroupSerializer, PendingProcessSerializer, BoxSerializer, TeamsSerializer, CurrencySerializer, RegionSerializer, ProcessSerializer, KillSwitchSerializer, ExchangeRatesSerializer, UserWatchlistConfigSerializer, RegionStrategyManagerSerializer, StrategySerializer
-from errormails.models import ErrorMail
-from subteams.models import SubTeam
 
+from mysite.routers import ReplicaReadMixin
 from redisHome.redis_data import get_jwt_token
+from .bulk import collect_errors, create_all, get_bulk_items
+from .copy_jobs import get_copy_job, start_copy_job
+from .exchange_rates import exchange_rate_index
+from .pending_actions import load_pending_actions
+from .pnl_snapshot import pnl_snapshot
+from .recon_access import get_recon_strategy_ids, recon_enabled
+from .request_context import RequestContextMixin
+from .sparse_fields import StrategyCursorPagination, restrict_to_fields
+from .token_refresh import refresh_coalescer
 
 
 logger = get_standard_logger(__name__, 'automate_backend.logs')
@@ -47,7 +57,7 @@ class BoxViewSet(BackendAPI):
     serializer_class = BoxSerializer
 
 
-class TeamsViewSet(BackendAPI):
+class TeamsViewSet(ReplicaReadMixin, BackendAPI):
     """
     API endpoint that allows boxes to be viewed or edited.
     """
@@ -81,7 +91,7 @@ class RegionStrategyManagerViewSet(BackendAPI):
         return RegionStrategyManage.objects.filter(user__pk=self.request.user.id)
 
 
-class PendingProcessViewSet(BackendAPI):
+class PendingProcessViewSet(ReplicaReadMixin, RequestContextMixin, BackendAPI):
     """
     API endpoint that allow all process in pending state, before adding in actual model is added or edited
     """
@@ -96,8 +106,7 @@ class PendingProcessViewSet(BackendAPI):
     def create(self, request, *args, **kwargs):
 
         form_data = request.data.copy()
-        request_user = User.objects.get(pk=request.user.id)
-        if not request_user.is_staff:
+        if not self.request_context.is_staff:
             raise PermissionDenied('You do not have permission to add new Strategy.')
         form_data['owner'] = request.user.id
         serializer = self.serializer_class(data=form_data)
@@ -106,6 +115,24 @@ class PendingProcessViewSet(BackendAPI):
             return self.create_success_response(serializer.data)
         return self.create_error_response(form_errors=serializer.errors)
 
+    @validate_api()
+    @action(detail=False, methods=['POST'])
+    def bulk_create(self, request):
+        """
+        Create many pending processes in one transaction. Nothing is written unless every item is valid;
+        otherwise form_errors lists the errors of each item, in order.
+        """
+        if not self.request_context.is_staff:
+            raise PermissionDenied('You do not have permission to add new Strategy.')
+        items = get_bulk_items(request)
+        serializers = [self.serializer_class(data={**item, 'owner': request.user.id}) for item in items]
+        errors = collect_errors(serializers)
+        if errors:
+            return self.create_error_response(form_errors=errors)
+        with transaction.atomic():
+            create_all(serializers)
+        return self.create_success_response([serializer.data for serializer in serializers])
+
     @validate_api()
     def partial_update(self, request, pk=None):
         form_data = request.data.get('patch', {})
@@ -139,30 +166,19 @@ class PendingProcessViewSet(BackendAPI):
     def fetch_process_pending_actions(self, request):
         """
         View to list all Pending Process addition requests based on process type.
+        `process_id` returns the bundle of one process; `process_ids` (comma separated) returns bundles keyed by id.
         """
         try:
             args = request.GET
-            process_id = args['process_id']
             process_model = PROCESS_MAP[args["process_type"]]
-            process = process_model.priv.filter(pk=process_id).select_related('killswitch', 'pnlinfo', 'pnllimits',
-                                                                              "relationship").prefetch_related(
-                "binrelease_set", "subteam_set", "unittestconfig_set", "strategy", "phlnamestrategymapping_set",
-                Prefetch('errorobj', to_attr='errormails')).last()
-            if not process:
+            if 'process_ids' in args:
+                process_ids = [process_id for process_id in args['process_ids'].split(',') if process_id]
+                return self.create_success_response(load_pending_actions(process_model, process_ids))
+            process_id = args['process_id']
+            bundles = load_pending_actions(process_model, [process_id])
+            if not bundles:
                 raise Exception('No process with given pk')
-            data = {
-                "process": process.name,
-                "subteam": get_formatted_data(process, "subteam_set", msg_field='name', many_to_many=True),
-                "killswitch": get_formatted_data(process, "killswitch"),
-                "errormail": {"id": process.name if len(process.errormails) > 0 else None},
-                "binrelease": get_formatted_data(process, "binrelease_set", msg_field="name", many_to_many=True),
-                "unittest": get_formatted_data(process, "unittestconfig_set", many_to_many=True),
-                "strat_userid_mapping": get_formatted_data(process, "strategy", many_to_many=True),
-                "phl_mapping": get_formatted_data(process, "phlnamestrategymapping_set", many_to_many=True),
-                "pnl_info": get_formatted_data(process, "pnlinfo"),
-                "pnllimits": get_formatted_data(process, "pnllimits"),
-            }
-            return self.create_success_response(data)
+            return self.create_success_response(next(iter(bundles.values())))
         except Exception as e:
             data = {"error": str(e)}
             return self.create_error_response(error_message=str(e))
@@ -185,25 +201,6 @@ class PendingProcessViewSet(BackendAPI):
         pending_process.delete()
         return self.create_success_response({'ok': True})
 
-#
-# class StrategyTableViewSet(BackendAPI):
-#     serializer_class = ProcessSerializer
-#
-#     def get_queryset(self):
-#         return Strategy.priv.all()
-#
-#     def list(self, request, *args, **kwargs):
-#         queryset = self.get_queryset()
-#         requested_fields = request.GET.get('fields', None)
-#         requested_fields = requested_fields.split(',') if requested_fields else None
-#         page = self.paginate_queryset(queryset)
-#         if page is not None:
-#             serializer = self.get_serializer(page, many=True, fields=requested_fields)
-#             paged_data = self.paginator.add_page_info(serializer.data)
-#             return self.create_success_response(paged_data)
-#         serializer = self.get_serializer(queryset, many=True, fields=requested_fields)
-#         return self.create_success_response(serializer.data)
-
 
 class KillSwitchViewSet(BackendAPI):
     serializer_class = KillSwitchSerializer
@@ -212,19 +209,39 @@ class KillSwitchViewSet(BackendAPI):
         return KillSwitch.objects.all().select_related('strategy')
 
 
-class ProcessViewSet(BackendAPI):
+class ProcessViewSet(ReplicaReadMixin, RequestContextMixin, BackendAPI):
     """
     API endpoint that allows strategies to be viewed or edited.
     """
 
     serializer_class = ProcessSerializer
+    replica_actions = ('list', 'retrieve', 'pnl')
+    sparse_pagination_class = StrategyCursorPagination
 
     def get_queryset(self, edit=False):
-        if not edit and SubTeam.objects.filter(name__icontains='recon').exists():
-            user = User.objects.get(pk=self.request.user.id)
-            return Strategy.priv.filter_by_recon(user)
+        if not edit and recon_enabled():
+            context = self.request_context
+            return Strategy.objects.filter(pk__in=get_recon_strategy_ids(context.user_id, lambda: context.user))
         return Strategy.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        """
+        With `fields` (comma separated) and/or `cursor`/`page_size`, serialize only the requested fields,
+        load only what they need and page by cursor. Without them, list everything as before.
+        """
+        if not {'fields', 'cursor', 'page_size'} & set(request.GET):
+            return super().list(request, *args, **kwargs)
+        requested_fields = request.GET.get('fields', None)
+        requested_fields = requested_fields.split(',') if requested_fields else None
+        serializer_fields = self.get_serializer(fields=requested_fields).fields
+        queryset = self.filter_queryset(self.get_queryset())
+        if requested_fields:
+            queryset = restrict_to_fields(queryset, serializer_fields)
+        paginator = self.sparse_pagination_class()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True, fields=requested_fields)
+        return self.create_success_response(paginator.add_page_info(serializer.data))
+
     @validate_api()
     def partial_update(self, request, pk=None):
         form_data = request.data
@@ -239,6 +256,38 @@ class ProcessViewSet(BackendAPI):
         serializer.save(allow_force_cpu_update=allow_force_cpu_update)
         return self.create_success_response(serializer.data)
 
+    @validate_api()
+    @action(detail=False, methods=['POST'])
+    def bulk_partial_update(self, request):
+        """
+        Partially update many strategies in one transaction; each item carries its `pk` and the fields to change.
+        `allow_force_cpu_update` may be set per item or for the whole request. Nothing is written unless every
+        item is valid; otherwise form_errors lists the errors of each item, in order.
+        Strategies are saved one by one so that their save logic and signals still run.
+        """
+        items = get_bulk_items(request)
+        default_force_cpu_update = request.data.get('allow_force_cpu_update', False) if isinstance(request.data, dict) else False
+        strategies = {str(pk): strategy for pk, strategy in
+                      self.get_queryset(edit=True).in_bulk([item.get('pk') for item in items]).items()}
+        serializers, errors = [], []
+        for item in items:
+            strategy = strategies.get(str(item.get('pk')))
+            if not strategy:
+                serializers.append(None)
+                errors.append({'pk': ['Not allowed to edit this strategy']})
+                continue
+            serializer = ProcessSerializer(strategy, data=item, partial=True)
+            serializers.append(serializer)
+            errors.append({} if serializer.is_valid() else serializer.errors)
+        if any(errors):
+            return self.create_error_response(form_errors=errors)
+
+        logger.info(f'Process bulk partial update requested for {len(items)} strategies, user- {request.user}')
+        with transaction.atomic():
+            for item, serializer in zip(items, serializers):
+                serializer.save(allow_force_cpu_update=item.get('allow_force_cpu_update', default_force_cpu_update))
+        return self.create_success_response([serializer.data for serializer in serializers])
+
     @validate_api()
     @action(detail=True, methods=['POST'])
     def copy_process(self, request, pk=None):
@@ -259,18 +308,47 @@ class ProcessViewSet(BackendAPI):
         if not (new_box_id and new_name and new_box):
             raise Exception("Name and new_box are required fields. and box with given name should exist.")
 
-        request_user = User.objects.get(pk=request.user.id)
-        status, data = copy_process_utility(orig_process, request_user, request_data=request_data)
+        status, data = copy_process_utility(orig_process, self.request_context.user, request_data=request_data)
         # Note- do not use orig_process after calling this function as it will be udpated to the new process created
         if status:
             return self.create_success_response(data)
         return self.create_error_response(form_errors=data)
 
+    @validate_api()
+    @action(detail=True, methods=['POST'])
+    def copy_process_batch(self, request, pk=None):
+        """
+        Copy an existing process onto many (new_name, new_box) targets in the background.
+        Returns a job id at once; poll copy_process_status with it for per-target results.
+        """
+        orig_process = Strategy.objects.filter(pk=pk).last()
+        if not orig_process:
+            return self.create_error_response(error_message={"message": f"Process with given PK {pk} doesn't exists"})
+        request_data = {key: value for key, value in request.data.items() if key != 'targets'}
+        targets = request.data.get('targets', [])
+        if not targets or not all(target.get('new_name') and target.get('new_box') for target in targets):
+            raise Exception("targets must be a non-empty list, each with new_name and new_box.")
+        box_ids = {str(pk) for pk in Box.objects.filter(pk__in=[target['new_box'] for target in targets]).values_list('pk', flat=True)}
+        missing_boxes = sorted({str(target['new_box']) for target in targets} - box_ids)
+        if missing_boxes:
+            raise Exception(f"No box exists with PK {', '.join(missing_boxes)}.")
+
+        job_id = start_copy_job(orig_process, self.request_context.user, targets, request_data)
+        return self.create_success_response({'job_id': job_id})
+
+    @validate_api()
+    @action(detail=False, methods=['GET'])
+    def copy_process_status(self, request):
+        job = get_copy_job(request.GET.get('job_id', ''))
+        if job is None:
+            return self.create_error_response(error_message='No copy job with given id')
+        return self.create_success_response(job)
+
     @validate_api()
     def api_post(self, request):
         slug_data = {"box": "name", "owner": "username", "currency": "symbol", "ERegion": "name", "team": "name"}
         form_data = request.data
-        if self.user_type(request.user) != "subteam":
+        if self.request_context.user_type != "subteam":
             raise Exception("This api is only allowed for subteams")
         serializer = self.serializer_class(data=form_data, slug_data=slug_data)
         if serializer.is_valid():
@@ -288,18 +366,7 @@ class ProcessViewSet(BackendAPI):
         """
         region_name = request.GET.get('region_name', '')
         strategy_names = request.GET.get('strategy_names', '')
-        all_strategies = Strategy.objects.filter(state='ACTIVE').exclude(pnlinfo=None).prefetch_related(
-            'box', 'ERegion', 'box__region', 'box__timezone', 'relationship', 'pnlinfo', 'currency', 'team',
-            Prefetch(
-            'errorobj',
-            queryset=ErrorMail.objects.filter(error_type='crash'),
-            to_attr='errormails')
-        )
-        if region_name:
-            all_strategies = all_strategies.filter(ERegion__name=region_name)
-        if strategy_names:
-            all_strategies = all_strategies.filter(name__in=strategy_names.split(','))
-        strategy_dict = check_strat_run(all_strategies)
+        strategy_dict = pnl_snapshot.get(region_name, strategy_names.split(',') if strategy_names else None)
         return self.create_success_response(data=strategy_dict)
 
 
@@ -310,10 +377,29 @@ class ExchangeRatesViewSet(BackendAPI):
 
     @validate_api()
     def get_currency_rates(self, request, *args, **kwargs):
+        """ Rates applied on request_date, or the latest before it; the latest overall without request_date """
         request_date = request.GET.get('request_date', None)
-        exchange_rates = self.queryset.filter(applied_date=request_date).last() if request_date else self.queryset.last()
-        serializer = self.serializer_class(exchange_rates)
-        return self.create_success_response(serializer.data)
+        if request_date:
+            request_date = parse_date(request_date)
+            if not request_date:
+                raise Exception('request_date must be in YYYY-MM-DD format.')
+        exchange_rates = exchange_rate_index.on_or_before(request_date)
+        return self.create_success_response(exchange_rates or self.serializer_class(None).data)
+
+    @validate_api()
+    def get_currency_rates_range(self, request, *args, **kwargs):
+        """
+        Rates for every date from start_date to end_date, plus the rates already in effect on start_date,
+        for reconstructing historical PnL in one call.
+        """
+        start_date = parse_date(request.GET.get('start_date', ''))
+        end_date = parse_date(request.GET.get('end_date', ''))
+        if not (start_date and end_date) or start_date > end_date:
+            raise Exception('start_date and end_date are required, in YYYY-MM-DD format, with start_date <= end_date.')
+        return self.create_success_response({
+            'effective_at_start': exchange_rate_index.on_or_before(start_date),
+            'rates': exchange_rate_index.between(start_date, end_date),
+        })
 
 
 class UserWatchlistConfigViewSet(BackendAPI):
@@ -350,12 +436,23 @@ class QeUserRefreshTokenView(BackendAPI):  # CSRFExemptMixin
 
     def post(self, request, *args, **kwargs):
         refresh_token = request.POST.get('refresh')
-        if not get_jwt_token(refresh_token):
-            serializer = self.serializer_class(data=request.data)
-            try:
-                serializer.is_valid(raise_exception=True)
-            except TokenError as e:
-                return self.create_error_response(error_message=str(e), status_code=403)
-            return self.create_success_response(serializer.validated_data)
-
-        return self.create_error_response(error_message="Token is expired because user logged out", status_code=403)
\ No newline at end of file
+        if not refresh_token:
+            status, data = self.refresh(refresh_token, request.data)
+        elif refresh_coalescer.is_revoked(refresh_token):
+            status, data = False, "Token is expired because user logged out"
+        else:
+            status, data = refresh_coalescer.run(refresh_token, lambda: self.refresh(refresh_token, request.data))
+        if status:
+            return self.create_success_response(data)
+        return self.create_error_response(error_message=data, status_code=403)
+
+    def refresh(self, refresh_token, form_data):
+        if get_jwt_token(refresh_token):
+            refresh_coalescer.mark_revoked(refresh_token)
+            return False, "Token is expired because user logged out"
+        serializer = self.serializer_class(data=form_data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            return False, str(e)
+        return True, serializer.validated_data
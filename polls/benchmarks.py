@@ -0,0 +1,135 @@
+import statistics
+import time
+import tracemalloc
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import redis_data
+from .models import User, UserProfile, Teams, TeamMembership
+from .team_data import backfill_team_names
+
+SEED_USERS = 10000
+SEED_TEAMS = 500
+SEED_TEAMS_PER_USER = 3
+SEED_BATCH_SIZE = 1000
+# Fraction by which a metric may grow over the baseline before it counts as a regression.
+REGRESSION_THRESHOLD = 0.2
+# Metrics compared against the baseline; lower is better for each.
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'queries', 'peak_alloc_kib')
+
+# Directory pages: URL name and query params.
+DIRECTORY_SCENARIOS = {
+    'user_list': ('index', {}),
+    'user_list_page': ('index', {'page_size': 100}),
+    'users': ('users', {}),
+    'users_page': ('users', {'page_size': 100}),
+    'users_lookup': ('users_lookup', {'users': ','.join(f'bench{i}' for i in range(0, SEED_USERS, 100))}),
+}
+
+
+def seed_directory(users=SEED_USERS, teams=SEED_TEAMS, teams_per_user=SEED_TEAMS_PER_USER,
+                   batch_size=SEED_BATCH_SIZE):
+    """Bulk create synthetic users with profiles and team memberships, then fill in team_names."""
+    team_rows = Teams.objects.bulk_create([Teams(name=f'bench-team-{i}') for i in range(teams)], batch_size)
+    for start in range(0, users, batch_size):
+        user_rows = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', first_name='Bench', last_name=str(i))
+            for i in range(start, min(start + batch_size, users))])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in user_rows])
+        TeamMembership.objects.bulk_create([
+            TeamMembership(user=user, team=team_rows[(user.pk + offset) % teams])
+            for user in user_rows for offset in range(min(teams_per_user, teams))])
+    for _ in backfill_team_names(batch_size):
+        pass
+
+
+def backend_scenarios():
+    """
+    Backend endpoints as (view, query params) pairs, when the backend apps are installed.
+    They run against the strategies already in the database; seed_directory does not create any.
+    """
+    if not apps.is_installed('automate'):
+        return {}
+    from automate.models import PROCESS_MAP, Strategy
+    from .backend import ExchangeRatesViewSet, PendingProcessViewSet, ProcessViewSet
+
+    process_type = next((name for name, model in PROCESS_MAP.items() if model is Strategy), None)
+    process_ids = ','.join(str(pk) for pk in Strategy.objects.order_by('pk').values_list('pk', flat=True)[:100])
+    return {
+        'pnl': (ProcessViewSet.as_view({'get': 'pnl'}), {}),
+        'fetch_process_pending_actions': (
+            PendingProcessViewSet.as_view({'get': 'fetch_process_pending_actions'}),
+            {'process_type': process_type, 'process_ids': process_ids}),
+        'get_currency_rates': (ExchangeRatesViewSet.as_view({'get': 'get_currency_rates'}), {}),
+    }
+
+
+def measure(request, iterations, warm=False):
+    """
+    Latency percentiles, mean query count and median peak traced allocation of `iterations` calls of
+    `request`. Unless warm, the page and holiday caches are cleared before each call.
+    """
+    latencies, queries, peaks = [], [], []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            if not warm:
+                cache.clear()
+                redis_data.clear_holiday_cache()
+            tracemalloc.reset_peak()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                request()
+                latencies.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'iterations': iterations,
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+        'queries': statistics.mean(queries),
+        'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+def run_benchmarks(iterations, names=None, warm=False, user=None):
+    """Measure every scenario (or those in `names`); backend scenarios run as `user`."""
+    client = Client()
+    results = {}
+    for name, (url_name, params) in DIRECTORY_SCENARIOS.items():
+        if names is None or name in names:
+            results[name] = measure(lambda: client.get(reverse(url_name), params), iterations, warm)
+
+    backend = {name: scenario for name, scenario in backend_scenarios().items() if names is None or name in names}
+    if backend:
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        factory = APIRequestFactory()
+
+        def call(view, params):
+            request = factory.get('/', params)
+            force_authenticate(request, user=user)
+            view(request).render()
+
+        for name, (view, params) in backend.items():
+            results[name] = measure(lambda: call(view, params), iterations, warm)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """(scenario, metric, baseline value, current value) for each metric that grew by more than threshold."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric in COMPARED_METRICS:
+            before = baseline.get(name, {}).get(metric)
+            if before is not None and metrics[metric] > before * (1 + threshold):
+                regressions.append((name, metric, before, metrics[metric]))
+    return regressions
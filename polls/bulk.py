@@ -0,0 +1,45 @@
+from django.db.models import Model
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ModelSerializer
+
+MAX_BULK_ITEMS = 1000
+BULK_BATCH_SIZE = 500
+
+
+def get_bulk_items(request):
+    """The list of items of a bulk request, sent either as the body itself or as its `items` key."""
+    items = request.data.get('items') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ValidationError('Expected a non-empty list of objects.')
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValidationError(f'At most {MAX_BULK_ITEMS} items can be sent at once.')
+    return items
+
+
+def collect_errors(serializers):
+    """Validate every serializer; returns per-item errors aligned with the items, or None if all are valid."""
+    errors = [{} if serializer.is_valid() else serializer.errors for serializer in serializers]
+    return errors if any(errors) else None
+
+
+def create_all(serializers):
+    """
+    Save validated create serializers, through a single bulk_create when neither the serializer nor the
+    model customises saving. Like bulk_create, that path sends no save signals.
+    """
+    serializer = serializers[0]
+    model = serializer.Meta.model
+    if type(serializer).create is not ModelSerializer.create or model.save is not Model.save:
+        return [serializer.save() for serializer in serializers]
+
+    instances, relations = [], []
+    for serializer in serializers:
+        data = dict(serializer.validated_data)
+        relations.append({field.name: data.pop(field.name) for field in model._meta.many_to_many if field.name in data})
+        instances.append(model(**data))
+    model.objects.bulk_create(instances, batch_size=BULK_BATCH_SIZE)
+    for serializer, instance, instance_relations in zip(serializers, instances, relations):
+        for name, values in instance_relations.items():
+            getattr(instance, name).set(values)
+        serializer.instance = instance
+    return instances
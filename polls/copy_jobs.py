@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import CopyJob, CopyJobTarget
+from .tasks import copy_process_target
+
+
+def get_copy_job(job_id):
+    """{'status', 'source', 'created', 'targets': [{'new_name', 'new_box', 'status', 'data'}]}, or None."""
+    try:
+        job = CopyJob.objects.filter(pk=job_id).first()
+    except ValidationError:
+        return None
+    if job is None:
+        return None
+    targets = list(job.targets.order_by('pk').values('new_name', 'new_box', 'status', 'data'))
+    statuses = {target['status'] for target in targets}
+    if statuses & {'pending', 'running'}:
+        status = 'running' if statuses - {'pending'} else 'pending'
+    else:
+        status = 'failed' if 'failed' in statuses else 'done'
+    return {'status': status, 'source': job.source_id, 'created': job.created_date.timestamp(), 'targets': targets}
+
+
+def start_copy_job(source, user, targets, request_data):
+    """
+    Record copies of `source` onto each (new_name, new_box) target and queue one celery task per target
+    once the job is committed. Returns the job id straight away. Job state lives in the database, so any
+    worker can report it and it survives restarts; `request_data` holds the copy flags shared by every target.
+    """
+    with transaction.atomic():
+        job = CopyJob.objects.create(source_id=source.pk, user=user, request_data=request_data)
+        target_rows = CopyJobTarget.objects.bulk_create([
+            CopyJobTarget(job=job, new_name=target['new_name'], new_box=str(target['new_box']))
+            for target in targets])
+        target_ids = [target.pk for target in target_rows]
+
+        def enqueue():
+            for target_id in target_ids:
+                copy_process_target.delay(target_id)
+
+        transaction.on_commit(enqueue)
+    return job.pk.hex
@@ -0,0 +1,216 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import User, UserProfile, Teams, TeamMembership
+from .signals import DIRECTORY_VERSION_KEY, bump_cache_version
+from .team_data import refresh_team_names
+
+TRANSFER_BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+# File column -> ORM lookup, per kind of record. Related rows are referred to by username and team name.
+TRANSFER_FIELDS = {
+    'teams': {
+        'name': 'name',
+        'team_type': 'team_type',
+        'email': 'email',
+        'slack_id': 'slack_id',
+        'secondary_slack_id': 'secondary_slack_id',
+    },
+    'memberships': {
+        'username': 'user__username',
+        'team': 'team__name',
+    },
+    'profiles': {
+        'username': 'user__username',
+        'box_username': 'box_username',
+        'primary_team': 'primary_team__name',
+        'is_internal': 'is_internal',
+        'emp_id': 'emp_id',
+        'designation': 'designation',
+        'institution': 'institution',
+        'phone': 'phone',
+        'extension_no': 'extension_no',
+        'slack_id': 'slack_id',
+        'asana_id': 'asana_id',
+        'image_location': 'image_location',
+        'dob': 'dob',
+        'doj': 'doj',
+        'anniversary_date': 'anniversary_date',
+    },
+}
+TRANSFER_MODELS = {'teams': Teams, 'memberships': TeamMembership, 'profiles': UserProfile}
+
+
+def read_records(lines, file_format):
+    """
+    Yield each record of a CSV (with a header row) or JSONL file as a dict. A JSONL line that is not
+    a JSON object is yielded as a ValueError instead, for import_records to report as skipped.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f'line {number}: {e}')
+            continue
+        yield record if isinstance(record, dict) else ValueError(f'line {number}: not a JSON object')
+
+
+def write_records(out, file_format, columns, records):
+    """Write records (dicts keyed by column) as CSV with a header row, or as JSONL. Returns the count."""
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(out, columns)
+        writer.writeheader()
+        for count, record in enumerate(records, 1):
+            writer.writerow({column: '' if value is None else value for column, value in record.items()})
+    else:
+        for count, record in enumerate(records, 1):
+            out.write(json.dumps(record, cls=DjangoJSONEncoder) + '\n')
+    return count
+
+
+def export_records(kind, batch_size=TRANSFER_BATCH_SIZE):
+    """Every record of a kind, as dicts keyed by file column, streamed from the database in batches."""
+    fields = TRANSFER_FIELDS[kind]
+    rows = TRANSFER_MODELS[kind].objects.order_by('pk').values_list(*fields.values())
+    for row in rows.iterator(chunk_size=batch_size):
+        yield dict(zip(fields, row))
+
+
+def clean_value(model, field_name, value):
+    field = model._meta.get_field(field_name)
+    if value in ('', None) and field.null:
+        return None
+    return field.to_python(value)
+
+
+def import_records(kind, records, batch_size=TRANSFER_BATCH_SIZE, update_existing=True):
+    """
+    Load records of a kind in batches of batch_size. Teams are matched on name and profiles on username;
+    existing ones get the file's columns written over them unless update_existing is False. A profile
+    whose box_username belongs to another user is skipped, as is a membership that already exists.
+    Yields (records read, rows created or updated, [skip reasons]) per batch; records that could not be
+    parsed (ValueErrors from read_records) are skipped too.
+    Bulk writes send no model signals, so team_names and the directory version are refreshed here.
+    """
+    records = iter(records)
+    load_batch = {'teams': load_teams, 'memberships': load_memberships, 'profiles': load_profiles}[kind]
+    try:
+        while batch := list(islice(records, batch_size)):
+            invalid = [str(record) for record in batch if isinstance(record, ValueError)]
+            written, skipped = load_batch([record for record in batch if isinstance(record, dict)], update_existing)
+            yield len(batch), written, invalid + skipped
+    finally:
+        bump_cache_version(DIRECTORY_VERSION_KEY)
+
+
+def build_rows(model, batch, columns, skipped):
+    """(record, {field: cleaned value}) for each record in batch whose values are valid."""
+    rows = []
+    for record in batch:
+        try:
+            rows.append((record, {field: clean_value(model, field, record[column])
+                                  for column, field in columns.items() if column in record}))
+        except ValidationError as e:
+            skipped.append(f'{record}: {"; ".join(e.messages)}')
+    return rows
+
+
+def upsert(model, rows, unique_field, update_existing):
+    """
+    Insert rows (dicts of field values), updating the fields each row carries where its unique_field
+    already exists, or leaving such rows be. Rows are written in groups of the same fields, so a column
+    one record lacks is never written over with its default because another record in the batch has it.
+    """
+    groups = {}
+    for values in rows:
+        groups.setdefault(frozenset(values), []).append(model(**values))
+    return sum(upsert_group(model, objects, unique_field, fields, update_existing)
+               for fields, objects in groups.items())
+
+
+def upsert_group(model, objects, unique_field, fields, update_existing):
+    attname = model._meta.get_field(unique_field).attname
+    update_fields = sorted(set(fields) - {unique_field, attname})
+    if update_existing and update_fields:
+        model.objects.bulk_create(objects, update_conflicts=True, unique_fields=[unique_field],
+                                  update_fields=update_fields + ['modified_date'])
+        return len(objects)
+    existing = set(model.objects.filter(**{f'{attname}__in': [getattr(obj, attname) for obj in objects]}).values_list(
+        attname, flat=True))
+    objects = [obj for obj in objects if getattr(obj, attname) not in existing]
+    # Rows created since the lookup are still left alone.
+    model.objects.bulk_create(objects, ignore_conflicts=True)
+    return len(objects)
+
+
+def load_teams(batch, update_existing):
+    skipped = []
+    columns = {column: column for column in TRANSFER_FIELDS['teams']}
+    # A name repeated within the batch keeps its last record.
+    teams = {}
+    for record, values in build_rows(Teams, batch, columns, skipped):
+        if values.get('name'):
+            teams[values['name']] = values
+        else:
+            skipped.append(f'{record}: no team name')
+    return upsert(Teams, list(teams.values()), 'name', update_existing), skipped
+
+
+def load_memberships(batch, update_existing):
+    skipped = []
+    user_ids = dict(User.objects.filter(username__in={r.get('username') for r in batch}).values_list('username', 'id'))
+    team_ids = dict(Teams.objects.filter(name__in={r.get('team') for r in batch}).values_list('name', 'id'))
+    pairs = set()
+    for record in batch:
+        if record.get('username') not in user_ids or record.get('team') not in team_ids:
+            skipped.append(f'{record}: unknown user or team')
+        else:
+            pairs.add((user_ids[record['username']], team_ids[record['team']]))
+    pairs -= set(TeamMembership.objects.filter(user_id__in={user_id for user_id, _ in pairs}).values_list(
+        'user_id', 'team_id'))
+    TeamMembership.objects.bulk_create([TeamMembership(user_id=user_id, team_id=team_id)
+                                        for user_id, team_id in sorted(pairs)])
+    refresh_team_names({user_id for user_id, _ in pairs})
+    return len(pairs), skipped
+
+
+def load_profiles(batch, update_existing):
+    skipped = []
+    columns = {column: field for column, field in TRANSFER_FIELDS['profiles'].items()
+               if column not in ('username', 'primary_team')}
+    user_ids = dict(User.objects.filter(username__in={r.get('username') for r in batch}).values_list('username', 'id'))
+    team_ids = dict(Teams.objects.filter(name__in={r.get('primary_team') for r in batch} - {None, ''}).values_list(
+        'name', 'id'))
+    box_owners = dict(UserProfile.objects.filter(
+        box_username__in={r.get('box_username') for r in batch} - {None, ''}).values_list('box_username', 'user_id'))
+
+    profiles = {}
+    for record, values in build_rows(UserProfile, batch, columns, skipped):
+        user_id = user_ids.get(record.get('username'))
+        primary_team = record.get('primary_team')
+        box_username = values.get('box_username')
+        if user_id is None:
+            skipped.append(f'{record}: unknown user')
+        elif primary_team and primary_team not in team_ids:
+            skipped.append(f'{record}: unknown primary team')
+        elif box_username is not None and box_owners.setdefault(box_username, user_id) != user_id:
+            skipped.append(f'{record}: box_username {box_username} belongs to another user')
+        else:
+            if 'primary_team' in record:
+                values['primary_team_id'] = team_ids.get(primary_team)
+            profiles[user_id] = {'user_id': user_id, **values}
+
+    written = upsert(UserProfile, list(profiles.values()), 'user', update_existing)
+    refresh_team_names(list(profiles))
+    return written, skipped
@@ -0,0 +1,107 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+from automate.models import ExchangeRates
+from automate.serializers import ExchangeRatesSerializer
+
+from .periodic_reload import PeriodicReload
+
+# Full reload interval in seconds.
+INDEX_MAX_AGE = 60
+
+
+class ExchangeRateIndex(PeriodicReload):
+    """
+    Serialized ExchangeRates rows sorted by (applied_date, pk), for O(log n) "latest on or before a date"
+    and date-range lookups. Warmed when the first request starts, kept current from ExchangeRates save/delete
+    signals and reloaded once INDEX_MAX_AGE has passed. Lists are replaced rather than mutated, so lookups
+    need no lock. Rows updated while a reload reads the table are re-read once it has swapped its lists in,
+    so the older reload never wins over them.
+    """
+
+    max_age = INDEX_MAX_AGE
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rates = []
+        # Pks updated since the running reload started, or None when none is running.
+        self._updated_during_reload = None
+
+    def reload(self):
+        with self._lock:
+            self._updated_during_reload = set()
+        try:
+            keys, rates = [], []
+            for exchange_rates in ExchangeRates.objects.order_by('applied_date', 'pk'):
+                keys.append((exchange_rates.applied_date, exchange_rates.pk))
+                rates.append(ExchangeRatesSerializer(exchange_rates).data)
+        finally:
+            with self._lock:
+                updated, self._updated_during_reload = self._updated_during_reload, None
+        with self._lock:
+            self._keys, self._rates, self._loaded_at = keys, rates, time.monotonic()
+        for pk in updated:
+            self.update(pk)
+
+    def on_or_before(self, date=None):
+        """The rates applied on `date`, or the latest ones before it; the latest overall when date is None."""
+        self.reload_if_stale()
+        keys, rates = self._keys, self._rates
+        index = len(keys) if date is None else bisect_right(keys, (date, float('inf')))
+        return rates[index - 1] if index else None
+
+    def between(self, start_date, end_date):
+        """Rates applied from start_date to end_date inclusive, oldest first."""
+        self.reload_if_stale()
+        keys, rates = self._keys, self._rates
+        return rates[bisect_left(keys, (start_date, float('-inf'))):bisect_right(keys, (end_date, float('inf')))]
+
+    def update(self, pk):
+        """Re-read one row after it was saved or deleted."""
+        with self._lock:
+            if self._updated_during_reload is not None:
+                self._updated_during_reload.add(pk)
+            if not self._loaded_at:
+                return
+        exchange_rates = ExchangeRates.objects.filter(pk=pk).first()
+        entry = None
+        if exchange_rates is not None:
+            entry = ((exchange_rates.applied_date, exchange_rates.pk), ExchangeRatesSerializer(exchange_rates).data)
+        with self._lock:
+            entries = [(key, rate) for key, rate in zip(self._keys, self._rates) if key[1] != pk]
+            if entry is not None:
+                entries.insert(bisect_left([entry_key for entry_key, _ in entries], entry[0]), entry)
+            self._keys = [key for key, _ in entries]
+            self._rates = [rate for _, rate in entries]
+
+
+exchange_rate_index = ExchangeRateIndex()
+
+
+def update_exchange_rate(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: exchange_rate_index.update(pk))
+
+
+def warm_exchange_rate_index(sender, **kwargs):
+    request_started.disconnect(warm_exchange_rate_index)
+
+    def warm():
+        try:
+            exchange_rate_index.reload_if_stale()
+        finally:
+            connection.close()
+
+    threading.Thread(target=warm, daemon=True).start()
+
+
+request_started.connect(warm_exchange_rate_index)
+post_save.connect(update_exchange_rate, sender=ExchangeRates)
+post_delete.connect(update_exchange_rate, sender=ExchangeRates)
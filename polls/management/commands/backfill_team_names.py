@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from polls.team_data import BACKFILL_BATCH_SIZE, backfill_team_names
+
+
+class Command(BaseCommand):
+    help = 'Populate UserProfile.team_names from TeamMembership in bulk batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        seen = updated = 0
+        for batch_seen, batch_updated in backfill_team_names(options['batch_size']):
+            seen += batch_seen
+            updated += batch_updated
+            self.stdout.write(f'{seen} profiles checked, {updated} updated')
+        self.stdout.write(self.style.SUCCESS(f'Backfilled team_names: {updated} of {seen} profiles updated.'))
@@ -0,0 +1,109 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+# Large enough that a write transaction touching every row overflows SQLite's default 2 MB page cache.
+# Without WAL, spilling it takes the exclusive lock early and holds it until commit, locking readers out.
+BENCHMARK_ROWS = 20000
+BENCHMARK_PAYLOAD = 'x' * 200
+SQLITE_PROFILES = {
+    'development': {},
+    'production': settings.SQLITE_PRODUCTION,
+}
+
+
+class Command(BaseCommand):
+    help = ('Measure SQLite read latency while writers hold write transactions, for each DB profile, '
+            'on a scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per profile.')
+        parser.add_argument('--write-hold', type=float, default=50,
+                            help='Milliseconds each write transaction stays open after its update.')
+
+    def handle(self, *args, **options):
+        for profile, overrides in SQLITE_PROFILES.items():
+            with tempfile.TemporaryDirectory() as scratch_dir:
+                alias = f'benchmark_{profile}'
+                connections.settings[alias] = {
+                    **connections['default'].settings_dict,
+                    'CONN_MAX_AGE': 0,
+                    'OPTIONS': {},
+                    'PRAGMAS': {},
+                    **overrides,
+                    'NAME': os.path.join(scratch_dir, 'benchmark.sqlite3'),
+                }
+                try:
+                    self.report(profile, *self.run(alias, options))
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+    def run(self, alias, options):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE benchmark_rows '
+                           '(id INTEGER PRIMARY KEY, value INTEGER NOT NULL, payload TEXT NOT NULL)')
+            cursor.executemany('INSERT INTO benchmark_rows (value, payload) VALUES (%s, %s)',
+                               [(0, BENCHMARK_PAYLOAD)] * BENCHMARK_ROWS)
+
+        deadline = time.monotonic() + options['duration']
+        write_hold = options['write_hold'] / 1000
+        read_latencies, writes, errors = [], [], []
+        lock = threading.Lock()
+
+        def reader():
+            latencies, failed = [], 0
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT value FROM benchmark_rows WHERE id = 1')
+                        cursor.fetchone()
+                except OperationalError:
+                    failed += 1
+                latencies.append(time.perf_counter() - start)
+            connections[alias].close()
+            with lock:
+                read_latencies.extend(latencies)
+                errors.append(failed)
+
+        def writer():
+            committed, failed = 0, 0
+            while time.monotonic() < deadline:
+                try:
+                    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                        cursor.execute('UPDATE benchmark_rows SET value = value + 1')
+                        time.sleep(write_hold)
+                    committed += 1
+                except OperationalError:
+                    failed += 1
+            connections[alias].close()
+            with lock:
+                writes.append(committed)
+                errors.append(failed)
+
+        threads = ([threading.Thread(target=reader) for _ in range(options['readers'])]
+                   + [threading.Thread(target=writer) for _ in range(options['writers'])])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return read_latencies, sum(writes), sum(errors), options['duration']
+
+    def report(self, profile, read_latencies, writes, errors, duration):
+        quantiles = statistics.quantiles(read_latencies, n=100)
+        self.stdout.write(self.style.MIGRATE_HEADING(profile))
+        self.stdout.write(f'{len(read_latencies) / duration:.1f} reads/s, p50 {quantiles[49] * 1000:.2f} ms, '
+                          f'p99 {quantiles[98] * 1000:.2f} ms, max {max(read_latencies) * 1000:.2f} ms; '
+                          f'{writes / duration:.1f} writes/s')
+        if errors:
+            self.stdout.write(self.style.ERROR(f'{errors} statements failed with "database is locked"'))
@@ -0,0 +1,102 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from polls import redis_data
+
+# Sync view served through the WSGI handler, and its async version served through the ASGI handler.
+BENCHMARK_PAGES = {
+    'users': ('users', 'users_async'),
+    'user_list': ('index', 'index_async'),
+}
+
+
+class SlowRedis:
+    """Wrap a Redis client so every command takes at least `latency` seconds, like a remote server would."""
+
+    def __init__(self, client, latency):
+        self._client = client
+        self._latency = latency
+
+    def __getattr__(self, command):
+        def run(*args, **kwargs):
+            time.sleep(self._latency)
+            return getattr(self._client, command)(*args, **kwargs)
+        return run
+
+
+class Command(BaseCommand):
+    help = 'Compare directory page throughput of the sync views under WSGI and the async views under ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', choices=sorted(BENCHMARK_PAGES), default='users')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--redis-latency', type=float, default=5,
+                            help='Milliseconds added to every Redis command.')
+        parser.add_argument('--warm', action='store_true',
+                            help='Keep the page and holiday caches instead of clearing them before each request.')
+
+    def handle(self, *args, **options):
+        self.warm = options['warm']
+        sync_url, async_url = (reverse(name) for name in BENCHMARK_PAGES[options['page']])
+        previous_client = redis_data.get_redis_client()
+        redis_data.set_redis_client(SlowRedis(previous_client or redis_data.InMemoryRedis(),
+                                              options['redis_latency'] / 1000))
+        try:
+            # The test clients send requests for the 'testserver' host.
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self.report('sync WSGI', *self.run_wsgi(sync_url, options['requests'], options['concurrency']))
+                self.report('async ASGI', *asyncio.run(
+                    self.run_asgi(async_url, options['requests'], options['concurrency'])))
+        finally:
+            redis_data.set_redis_client(previous_client)
+
+    def reset_caches(self):
+        if not self.warm:
+            cache.clear()
+            redis_data.clear_holiday_cache()
+
+    def run_wsgi(self, url, requests, concurrency):
+        def fetch(_):
+            self.reset_caches()
+            start = time.perf_counter()
+            status = Client().get(url).status_code
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(fetch, range(requests)))
+        return results, time.perf_counter() - start
+
+    async def run_asgi(self, url, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with semaphore:
+                self.reset_caches()
+                start = time.perf_counter()
+                status = (await client.get(url)).status_code
+                return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(fetch() for _ in range(requests)))
+        return results, time.perf_counter() - start
+
+    def report(self, label, results, elapsed):
+        latencies = [latency for _, latency in results]
+        failed = sum(status != 200 for status, _ in results)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'{len(latencies) / elapsed:.1f} req/s, p50 {quantiles[49] * 1000:.1f} ms, '
+                          f'p95 {quantiles[94] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms')
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{failed} of {len(results)} requests failed'))
@@ -0,0 +1,78 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from polls import redis_data
+from polls.benchmarks import (
+    DIRECTORY_SCENARIOS, REGRESSION_THRESHOLD, SEED_TEAMS, SEED_USERS, compare_to_baseline, run_benchmarks,
+    seed_directory)
+from polls.models import User
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the directory pages (and backend endpoints, when installed) on synthetic data: latency '
+            'percentiles, query counts and allocations, optionally checked against a saved baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help=f'Run only this scenario; repeatable. Directory ones: {", ".join(DIRECTORY_SCENARIOS)}.')
+        parser.add_argument('--users', type=int, default=SEED_USERS)
+        parser.add_argument('--teams', type=int, default=SEED_TEAMS)
+        parser.add_argument('--warm', action='store_true',
+                            help='Keep the page and holiday caches between iterations.')
+        parser.add_argument('--use-existing-db', action='store_true',
+                            help='Benchmark the configured database as is instead of a freshly seeded test database.')
+        parser.add_argument('--username', help='User the backend endpoints are called as.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Fail if a metric regressed against the results in this JSON file.')
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            if not os.path.exists(options['baseline']):
+                raise CommandError(f'No baseline at {options["baseline"]}')
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+
+        previous_client = redis_data.get_redis_client()
+        redis_data.set_redis_client(redis_data.InMemoryRedis())
+        test_db_name = None
+        try:
+            # No sampled profiling, no replicas (which would not hold the seeded rows) and the test client's host.
+            with override_settings(PROFILING={'SAMPLE_RATE': 0, 'LOG_FILE': os.devnull}, REPLICA_DATABASES=[],
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                if not options['use_existing_db']:
+                    test_db_name = connection.settings_dict['NAME']
+                    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                    self.stdout.write(f'Seeding {options["users"]} users in {options["teams"]} teams...')
+                    seed_directory(options['users'], options['teams'])
+                user = User.objects.get(username=options['username']) if options['username'] else None
+                results = run_benchmarks(options['iterations'], options['scenarios'], options['warm'], user)
+        finally:
+            if test_db_name is not None:
+                connection.creation.destroy_test_db(test_db_name, verbosity=0)
+            redis_data.set_redis_client(previous_client)
+
+        for name, metrics in results.items():
+            self.stdout.write(f'{name:<32} p50 {metrics["p50_ms"]:>9.2f} ms  p95 {metrics["p95_ms"]:>9.2f} ms  '
+                              f'p99 {metrics["p99_ms"]:>9.2f} ms  {metrics["queries"]:>6.1f} queries  '
+                              f'{metrics["peak_alloc_kib"]:>9.1f} KiB peak')
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'seeded': not options['use_existing_db'], 'users': options['users'],
+                           'teams': options['teams'], 'warm': options['warm'], 'results': results}, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare_to_baseline(results, baseline, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {metric} {before} -> {after}'))
+            if regressions:
+                raise CommandError(f'{len(regressions)} metrics regressed by more than {options["threshold"]:.0%}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
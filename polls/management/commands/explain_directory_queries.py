@@ -0,0 +1,43 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from polls.models import User, TeamMembership
+from polls.views import PAGE_SIZE, directory_profiles, user_list_profiles
+
+# SQLite reports a full table scan as a bare "SCAN <table>", PostgreSQL as "Seq Scan".
+FULL_SCAN_RE = re.compile(r'\bSCAN \S+$|Seq Scan', re.MULTILINE)
+
+
+def get_directory_queries():
+    return [
+        ('user_list', user_list_profiles()),
+        ('users', directory_profiles()),
+        ('users page', directory_profiles().filter(user__username__gt='')[:PAGE_SIZE + 1]),
+        ('users inactive', directory_profiles(is_active=False)),
+        ('team names refresh', TeamMembership.objects.filter(user_id__in=[1, 2]).order_by('id').values_list(
+            'user_id', 'team__name')),
+        ('team rename refresh', TeamMembership.objects.filter(team=1).values('user_id')),
+        ('users_lookup', User.objects.filter(username__in=['a', 'b']).values(
+            'username', 'email', 'userprofile__doj', 'userprofile__team_names')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Print the query plan of each directory view query and fail if any does a full table scan.'
+
+    def handle(self, *args, **options):
+        flagged = []
+        for label, queryset in get_directory_queries():
+            plan = queryset.explain()
+            scans = FULL_SCAN_RE.findall(plan)
+            if scans:
+                flagged.append(label)
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(plan)
+            for scan in scans:
+                self.stdout.write(self.style.ERROR(f'full table scan: {scan}'))
+        if flagged:
+            raise CommandError(f'Full table scans on {connection.vendor} in: {", ".join(flagged)}')
+        self.stdout.write(self.style.SUCCESS('No full table scans.'))
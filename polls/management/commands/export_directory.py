@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from polls.directory_io import FORMATS, TRANSFER_BATCH_SIZE, TRANSFER_FIELDS, export_records, write_records
+from polls.management.commands.import_directory import get_format
+
+
+class Command(BaseCommand):
+    help = ('Stream teams, team memberships or user profiles to a CSV or JSONL file ("-" for stdout) '
+            'in constant memory, in the format import_directory reads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(TRANSFER_FIELDS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        file_format = get_format(options['path'], options['format'])
+        to_stdout = options['path'] == '-'
+        out = self.stdout if to_stdout else open(options['path'], 'w', newline='', encoding='utf-8')
+        # Keep stdout clean when the records themselves go there.
+        progress = self.stderr if to_stdout else self.stdout
+        start = time.perf_counter()
+
+        def records():
+            for count, record in enumerate(export_records(options['kind'], options['batch_size']), 1):
+                yield record
+                if count % options['batch_size'] == 0:
+                    progress.write(f'{count} records written ({count / (time.perf_counter() - start):.0f} records/s)')
+
+        try:
+            count = write_records(out, file_format, list(TRANSFER_FIELDS[options['kind']]), records())
+        finally:
+            if not to_stdout:
+                out.close()
+        elapsed = time.perf_counter() - start
+        progress.write(self.style.SUCCESS(
+            f'Exported {count} {options["kind"]} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} records/s).'))
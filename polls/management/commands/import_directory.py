@@ -0,0 +1,49 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.directory_io import FORMATS, TRANSFER_BATCH_SIZE, TRANSFER_FIELDS, import_records, read_records
+
+
+def get_format(path, file_format):
+    file_format = file_format or ('csv' if path == '-' else path.rpartition('.')[2])
+    if file_format not in FORMATS:
+        raise CommandError(f'Cannot tell the format of {path}; pass --format ({" or ".join(FORMATS)}).')
+    return file_format
+
+
+class Command(BaseCommand):
+    help = ('Bulk load teams, team memberships or user profiles from a CSV or JSONL file ("-" for stdin). '
+            'Teams are matched on name and profiles on username.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(TRANSFER_FIELDS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=TRANSFER_BATCH_SIZE)
+        parser.add_argument('--on-conflict', choices=('update', 'skip'), default='update',
+                            help='Whether existing teams and profiles are updated from the file or left alone.')
+
+    def handle(self, *args, **options):
+        file_format = get_format(options['path'], options['format'])
+        lines = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        read = written = skipped = 0
+        start = time.perf_counter()
+        try:
+            for batch_read, batch_written, batch_skipped in import_records(
+                    options['kind'], read_records(lines, file_format), options['batch_size'],
+                    update_existing=options['on_conflict'] == 'update'):
+                read += batch_read
+                written += batch_written
+                skipped += len(batch_skipped)
+                for reason in batch_skipped:
+                    self.stderr.write(f'skipped {reason}')
+                self.stdout.write(f'{read} records read, {written} written, {skipped} skipped '
+                                  f'({read / (time.perf_counter() - start):.0f} records/s)')
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {options["kind"]}: {written} written, {skipped} skipped of {read} records '
+            f'in {time.perf_counter() - start:.1f}s.'))
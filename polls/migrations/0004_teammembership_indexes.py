@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:32
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polls', '0003_teammembership_remove_userprofile_bio_and_more'),
+    ]
+
+    operations = [
+        migrations.RenameIndex(
+            model_name='teammembership',
+            new_name='polls_tm_user_team_idx',
+            old_fields=('user', 'team'),
+        ),
+        # The directory filters auth_user on is_active and orders by username; auth owns that table,
+        # so its composite index is managed here with raw SQL.
+        migrations.RunSQL(
+            'CREATE INDEX polls_user_active_username_idx ON auth_user (is_active, username)',
+            'DROP INDEX polls_user_active_username_idx',
+        ),
+    ]
@@ -0,0 +1,32 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_team_names(apps, schema_editor):
+    """Fill in UserProfile.team_names, added empty by 0005, the way polls.team_data computes it."""
+    TeamMembership = apps.get_model('polls', 'TeamMembership')
+    UserProfile = apps.get_model('polls', 'UserProfile')
+    teams = defaultdict(list)
+    for user_id, team_name in TeamMembership.objects.order_by('id').values_list('user_id', 'team__name').iterator():
+        teams[user_id].append(team_name)
+    changed = []
+    for profile in UserProfile.objects.only('id', 'user_id', 'team_names').iterator(chunk_size=BATCH_SIZE):
+        team_names = ', '.join(teams.get(profile.user_id, []))
+        if profile.team_names != team_names:
+            profile.team_names = team_names
+            changed.append(profile)
+    UserProfile.objects.bulk_update(changed, ['team_names'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0006_copyjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_team_names, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
@@ -31,8 +33,8 @@ class TeamMembership(models.Model):
     modified_date = models.DateTimeField(auto_now=True, null=True)
 
     class Meta:
-        index_together = [
-            ['user', 'team']
+        indexes = [
+            models.Index(fields=['user', 'team'], name='polls_tm_user_team_idx'),
         ]
 
 class UserProfile(models.Model):
@@ -57,3 +59,30 @@ class UserProfile(models.Model):
     is_qeTeamEnabled = models.BooleanField(default=False)
     modified_date = models.DateTimeField(auto_now=True, null=True)
     designation = models.CharField(max_length=100, null=True, default=None)
+    # Comma separated names of the user's teams, kept in sync from TeamMembership/Teams signals.
+    team_names = models.TextField(default='', blank=True)
+
+
+class CopyJob(models.Model):
+    """A background copy of one strategy onto several (new_name, new_box) targets, run by celery."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    source_id = models.IntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Copy flags shared by every target.
+    request_data = models.JSONField(default=dict)
+    created_date = models.DateTimeField(auto_now_add=True)
+
+
+class CopyJobTarget(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'pending'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    )
+    job = models.ForeignKey(CopyJob, on_delete=models.CASCADE, related_name='targets')
+    new_name = models.CharField(max_length=200)
+    new_box = models.CharField(max_length=100)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=20, default='pending')
+    data = models.JSONField(null=True)
+    modified_date = models.DateTimeField(auto_now=True)
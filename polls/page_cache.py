@@ -0,0 +1,65 @@
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from mysite.routers import read_from_primary
+
+from .redis_data import HOLIDAY_CACHE_TTL, get_holiday_date
+from .signals import get_directory_version
+
+# Pages show the holiday set too, so they may not outlive its own cache; keys carry the holiday date,
+# so pages cached before local midnight are not served after it.
+DIRECTORY_CACHE_TIMEOUT = HOLIDAY_CACHE_TTL
+DIRECTORY_CACHE_PARAMS = ('after', 'page_size')
+
+
+def get_page_cache_key(request):
+    params = urlencode([(name, request.GET.get(name)) for name in DIRECTORY_CACHE_PARAMS if name in request.GET])
+    return 'polls:page:{}:{}:{}:{}'.format(
+        request.resolver_match.url_name, get_directory_version(), get_holiday_date(), params)
+
+
+def cache_directory_page(view):
+    """
+    Cache a directory page's rendered content under its URL name and paging params.
+    Keys include the directory version, so saving or deleting any directory model invalidates them,
+    and the local date of the holiday set.
+    Streaming responses are passed through uncached. Async views get an async wrapper.
+    Pages rendered for the cache read from the primary: a replica that has not caught up with the write
+    behind a version bump would otherwise be cached under the new version.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.GET.get('stream'):
+                return await view(request, *args, **kwargs)
+            key = await sync_to_async(get_page_cache_key)(request)
+            cached = await cache.aget(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            read_from_primary()
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                await cache.aset(key, (response.content, response['Content-Type']), DIRECTORY_CACHE_TIMEOUT)
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.GET.get('stream'):
+            return view(request, *args, **kwargs)
+        key = get_page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        read_from_primary()
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response.content, response['Content-Type']), DIRECTORY_CACHE_TIMEOUT)
+        return response
+    return wrapper
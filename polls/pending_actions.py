@@ -0,0 +1,32 @@
+from django.db.models import Exists, OuterRef
+
+from automate.backend_utilities import get_formatted_data
+
+
+def load_pending_actions(process_model, process_ids):
+    """
+    Dependency bundles of the given processes, keyed by process id, in a fixed number of queries:
+    one for the processes with their one-to-one dependents and one per related set, however many ids are asked for.
+    """
+    processes = process_model.priv.filter(pk__in=process_ids).select_related(
+        'killswitch', 'pnlinfo', 'pnllimits', 'relationship').prefetch_related(
+        "binrelease_set", "subteam_set", "unittestconfig_set", "strategy", "phlnamestrategymapping_set",
+    ).annotate(
+        # Only the presence of an errormail is reported, so none are loaded.
+        has_errormail=Exists(process_model.objects.filter(pk=OuterRef('pk'), errorobj__isnull=False)))
+    return {process.pk: format_pending_actions(process) for process in processes}
+
+
+def format_pending_actions(process):
+    return {
+        "process": process.name,
+        "subteam": get_formatted_data(process, "subteam_set", msg_field='name', many_to_many=True),
+        "killswitch": get_formatted_data(process, "killswitch"),
+        "errormail": {"id": process.name if process.has_errormail else None},
+        "binrelease": get_formatted_data(process, "binrelease_set", msg_field="name", many_to_many=True),
+        "unittest": get_formatted_data(process, "unittestconfig_set", many_to_many=True),
+        "strat_userid_mapping": get_formatted_data(process, "strategy", many_to_many=True),
+        "phl_mapping": get_formatted_data(process, "phlnamestrategymapping_set", many_to_many=True),
+        "pnl_info": get_formatted_data(process, "pnlinfo"),
+        "pnllimits": get_formatted_data(process, "pnllimits"),
+    }
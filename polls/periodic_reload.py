@@ -0,0 +1,33 @@
+import threading
+import time
+
+
+class PeriodicReload:
+    """
+    Base for in-process indexes of database rows that are rebuilt by `reload()` once `max_age` seconds
+    have passed, which picks up writes made by other processes (they do not signal this one).
+    Subclasses call super().__init__() and set `_loaded_at = time.monotonic()` when a reload completes.
+    """
+
+    max_age = 60
+
+    def __init__(self):
+        self._reload_lock = threading.Lock()
+        self._loaded_at = 0.0
+
+    def is_stale(self):
+        return time.monotonic() - self._loaded_at > self.max_age
+
+    def reload_if_stale(self):
+        if not self.is_stale():
+            return
+        # One thread reloads while the others keep using the current data, unless there is none yet.
+        if self._reload_lock.acquire(blocking=not self._loaded_at):
+            try:
+                if self.is_stale():
+                    self.reload()
+            finally:
+                self._reload_lock.release()
+
+    def reload(self):
+        raise NotImplementedError
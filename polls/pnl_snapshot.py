@@ -0,0 +1,255 @@
+import asyncio
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.db.models.signals import post_save, post_delete, pre_delete
+
+from automater.common_utility import get_standard_logger
+from automate.backend_utilities import check_strat_run
+from automate.models import Strategy, PnlInfo
+from errormails.models import ErrorMail
+
+from .periodic_reload import PeriodicReload
+from .signals import bump_cache_version, get_cache_version
+
+logger = get_standard_logger(__name__, 'automate_backend.logs')
+
+# Bumped on every write the snapshot depends on, so other processes (which get no signals for it) rebuild.
+# That needs a shared cache (CACHE_BACKEND); with the default per-process one, the full rebuild every
+# SNAPSHOT_MAX_AGE seconds is what picks up writes made elsewhere.
+PNL_VERSION_KEY = 'polls:pnl_version'
+SNAPSHOT_MAX_AGE = 60
+
+
+def pnl_strategies():
+    return Strategy.objects.filter(state='ACTIVE').exclude(pnlinfo=None).prefetch_related(
+        'box', 'ERegion', 'box__region', 'box__timezone', 'relationship', 'pnlinfo', 'currency', 'team',
+        Prefetch(
+            'errorobj',
+            queryset=ErrorMail.objects.filter(error_type='crash'),
+            to_attr='errormails')
+    )
+
+
+def live_pnl(region_name='', strategy_names=None):
+    """check_strat_run output straight from the database, for when the snapshot cannot be used."""
+    strategies = pnl_strategies()
+    if region_name:
+        strategies = strategies.filter(ERegion__name=region_name)
+    if strategy_names is not None:
+        strategies = strategies.filter(name__in=strategy_names)
+    return check_strat_run(strategies)
+
+
+class PnlSubscription:
+    """
+    Changed entries waiting to be sent to one stream client. Pending changes are coalesced per strategy,
+    so a slow client holds at most one entry per strategy and only ever receives the latest state.
+    """
+
+    def __init__(self, region_name, loop):
+        self.region_name = region_name
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def push(self, changes):
+        """Queue changes from any thread."""
+        with self._lock:
+            self._pending.update(changes)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            pass  # The client's event loop is gone; it will be unsubscribed.
+
+    async def wait(self, timeout):
+        """Pending changes ({name: entry, or None once removed}), or {} if none arrive within timeout seconds."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+        with self._lock:
+            changes, self._pending = self._pending, {}
+        return changes
+
+
+class PnlSnapshot(PeriodicReload):
+    """
+    Materialized check_strat_run output for every strategy shown on the PnL page, indexed by region
+    and strategy name. check_strat_run returns a dict keyed by strategy name, so the entries of one
+    strategy can be recomputed on their own when that strategy, its crash errormails or its pnl info change
+    in this process; writes in other processes bump PNL_VERSION_KEY, and a changed version means a rebuild.
+    Should it return anything else, the snapshot logs an error and get() queries live from then on.
+    Slices are replaced rather than mutated, so readers can serialize them without copying or locking.
+    Entries that actually changed are pushed to subscriptions of their region.
+    """
+
+    max_age = SNAPSHOT_MAX_AGE
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._all = {}
+        self._by_region = {}
+        self._region_by_name = {}
+        self._name_by_id = {}
+        self._version = None
+        self._keyed_by_name = True
+        self._subscriptions = set()
+
+    def is_stale(self):
+        # Once check_strat_run turned out not to be keyed by name, there is nothing worth rebuilding.
+        return self._keyed_by_name and (super().is_stale() or get_cache_version(PNL_VERSION_KEY) != self._version)
+
+    def reload(self):
+        # Read before the data, so a write that lands while this runs leaves the snapshot stale.
+        version = get_cache_version(PNL_VERSION_KEY)
+        strategies = pnl_strategies()
+        rows = list(strategies.values_list('pk', 'name', 'ERegion__name'))
+        entries = check_strat_run(strategies)
+        if not self.check_keyed_by_name(entries, rows):
+            return
+        by_region, region_by_name, name_by_id = {}, {}, {}
+        for pk, name, region_name in rows:
+            if name in entries:
+                name_by_id[pk] = name
+                region_by_name[name] = region_name
+                by_region.setdefault(region_name, {})[name] = entries[name]
+        with self._lock:
+            changes = [(region_name, name, None) for name, region_name in self._region_by_name.items()
+                       if region_by_name.get(name, region_name) != region_name or name not in region_by_name]
+            changes += [(region_name, name, entries[name]) for name, region_name in region_by_name.items()
+                        if self._region_by_name.get(name) != region_name or self._all.get(name) != entries[name]]
+            self._all = {name: entries[name] for name in region_by_name}
+            self._by_region, self._region_by_name, self._name_by_id = by_region, region_by_name, name_by_id
+            self._loaded_at, self._version = time.monotonic(), version
+        self._publish(changes)
+
+    def refresh(self, strategy_ids, version=None):
+        """
+        Recompute the entries of the given strategies, dropping those no longer shown on the PnL page.
+        `version` is what this write bumped PNL_VERSION_KEY to; when it directly follows the snapshot's own,
+        no other process wrote in between and the snapshot stays current without a rebuild.
+        """
+        strategy_ids = list(strategy_ids)
+        if not strategy_ids or not self._loaded_at or not self._keyed_by_name:
+            return
+        strategies = pnl_strategies().filter(pk__in=strategy_ids)
+        rows = list(strategies.values_list('pk', 'name', 'ERegion__name'))
+        entries = check_strat_run(strategies) if rows else {}
+        if not self.check_keyed_by_name(entries, rows):
+            return
+        with self._lock:
+            all_entries = dict(self._all)
+            changed_regions = {}
+            removed = {}
+
+            def region(region_name):
+                if region_name not in changed_regions:
+                    changed_regions[region_name] = dict(self._by_region.get(region_name, {}))
+                return changed_regions[region_name]
+
+            for pk in strategy_ids:
+                name = self._name_by_id.pop(pk, None)
+                if name is not None:
+                    region_name = self._region_by_name.pop(name, None)
+                    removed[name] = (region_name, all_entries.pop(name, None))
+                    region(region_name).pop(name, None)
+            changes = []
+            for pk, name, region_name in rows:
+                if name in entries:
+                    self._name_by_id[pk] = name
+                    self._region_by_name[name] = region_name
+                    all_entries[name] = region(region_name)[name] = entries[name]
+                    previous = removed.pop(name, None)
+                    if previous is not None and previous[0] != region_name:
+                        removed[name] = previous
+                    if previous != (region_name, entries[name]):
+                        changes.append((region_name, name, entries[name]))
+            changes = [(region_name, name, None) for name, (region_name, _) in removed.items()] + changes
+            self._all = all_entries
+            self._by_region = {**self._by_region, **changed_regions}
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+        self._publish(changes)
+
+    def check_keyed_by_name(self, entries, rows):
+        """Whether check_strat_run output for (pk, name, region) rows is keyed by their names; if not, stop using it."""
+        if isinstance(entries, dict) and set(entries) <= {name for _, name, _ in rows}:
+            return True
+        if self._keyed_by_name:
+            self._keyed_by_name = False
+            logger.error(f'check_strat_run returned {type(entries).__name__} not keyed by strategy name; '
+                         f'serving pnl from live queries instead of the snapshot')
+        return False
+
+    def get(self, region_name='', strategy_names=None):
+        self.reload_if_stale()
+        if not self._keyed_by_name:
+            return live_pnl(region_name, strategy_names)
+        entries = self._by_region.get(region_name, {}) if region_name else self._all
+        if strategy_names is None:
+            return entries
+        return {name: entries[name] for name in strategy_names if name in entries}
+
+    def subscribe(self, region_name, loop):
+        subscription = PnlSubscription(region_name, loop)
+        with self._lock:
+            self._subscriptions = self._subscriptions | {subscription}
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions = self._subscriptions - {subscription}
+
+    def _publish(self, changes):
+        if not changes:
+            return
+        for subscription in self._subscriptions:
+            sliced = {name: entry for region_name, name, entry in changes
+                      if not subscription.region_name or region_name == subscription.region_name}
+            if sliced:
+                subscription.push(sliced)
+
+
+pnl_snapshot = PnlSnapshot()
+
+
+def related_strategy_ids(sender, instance):
+    if sender is ErrorMail:
+        strategies = Strategy.objects.filter(errorobj=instance)
+    else:
+        strategies = Strategy.objects.filter(pnlinfo=instance)
+    return list(strategies.values_list('pk', flat=True))
+
+
+def refresh_on_commit(strategy_ids):
+    def refresh():
+        pnl_snapshot.refresh(strategy_ids, bump_cache_version(PNL_VERSION_KEY))
+    transaction.on_commit(refresh)
+
+
+def refresh_strategy(sender, instance, **kwargs):
+    refresh_on_commit([instance.pk])
+
+
+def remember_related_strategies(sender, instance, **kwargs):
+    # Once the row is gone its strategies can no longer be looked up, so note them beforehand.
+    instance._pnl_strategy_ids = related_strategy_ids(sender, instance)
+
+
+def refresh_related_strategies(sender, instance, **kwargs):
+    strategy_ids = getattr(instance, '_pnl_strategy_ids', None)
+    refresh_on_commit(strategy_ids if strategy_ids is not None else related_strategy_ids(sender, instance))
+
+
+post_save.connect(refresh_strategy, sender=Strategy)
+post_delete.connect(refresh_strategy, sender=Strategy)
+for model in (ErrorMail, PnlInfo):
+    pre_delete.connect(remember_related_strategies, sender=model)
+    post_save.connect(refresh_related_strategies, sender=model)
+    post_delete.connect(refresh_related_strategies, sender=model)
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseForbidden, StreamingHttpResponse
+
+from .pnl_snapshot import pnl_snapshot
+
+# Seconds between keepalive comments on an idle stream; also how often idle streams check for a stale snapshot
+# (which asks the cache for the PnL version, so it runs off the event loop).
+HEARTBEAT_INTERVAL = 15
+# Streams end after this many seconds and EventSource reconnects (after RECONNECT_DELAY ms). This bounds how
+# long the stream of a client that vanished without the server noticing keeps its subscription.
+STREAM_MAX_AGE = 300
+RECONNECT_DELAY = 1000
+
+
+def sse_event(event, data):
+    return 'event: {}\ndata: {}\n\n'.format(event, json.dumps(data, cls=DjangoJSONEncoder))
+
+
+async def pnl_stream(request):
+    """
+    Server-sent events for the PnL page, served natively under ASGI.
+    Sends a `snapshot` event with every strategy of `region_name` (all regions when empty), then an `update`
+    event ({name: entry, or null once removed}) whenever strategies in that region change.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return HttpResponseForbidden()
+    region_name = request.GET.get('region_name', '')
+
+    async def events():
+        # Subscribe before reading the snapshot so no change falls between the two.
+        subscription = pnl_snapshot.subscribe(region_name, asyncio.get_running_loop())
+        ends_at = time.monotonic() + STREAM_MAX_AGE
+        try:
+            yield f'retry: {RECONNECT_DELAY}\n\n'
+            yield sse_event('snapshot', await sync_to_async(pnl_snapshot.get)(region_name))
+            while time.monotonic() < ends_at:
+                changes = await subscription.wait(HEARTBEAT_INTERVAL)
+                if changes:
+                    yield sse_event('update', changes)
+                    continue
+                yield ': keepalive\n\n'
+                await sync_to_async(pnl_snapshot.reload_if_stale, thread_sensitive=False)()
+        finally:
+            pnl_snapshot.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_save, post_delete
+
+from automate.models import Strategy
+from subteams.models import SubTeam
+
+from .models import User
+from .signals import bump_cache_version, get_cache_version
+
+RECON_VERSION_KEY = 'polls:recon_version'
+# Version bumps only reach other processes through a shared cache (CACHE_BACKEND); with the default
+# per-process cache, subteam changes made by other workers or celery show up once this many seconds pass.
+RECON_CACHE_TIMEOUT = 15
+
+
+def recon_enabled():
+    """Whether any recon subteam exists, i.e. whether strategy listings are filtered by recon visibility."""
+    key = 'polls:recon:{}:enabled'.format(get_cache_version(RECON_VERSION_KEY))
+    enabled = cache.get(key)
+    if enabled is None:
+        enabled = SubTeam.objects.filter(name__icontains='recon').exists()
+        cache.set(key, enabled, RECON_CACHE_TIMEOUT)
+    return enabled
+
+
+def get_recon_strategy_ids(user_id, get_user=None):
+    """
+    Ids of the strategies Strategy.priv.filter_by_recon allows for the user, cached until a subteam,
+    its membership or a strategy changes, or RECON_CACHE_TIMEOUT passes. The user, from `get_user()` if given, is only
+    needed on a cache miss.
+    """
+    key = 'polls:recon:{}:user:{}'.format(get_cache_version(RECON_VERSION_KEY), user_id)
+    strategy_ids = cache.get(key)
+    if strategy_ids is None:
+        user = get_user() if get_user else User.objects.get(pk=user_id)
+        strategy_ids = frozenset(Strategy.priv.filter_by_recon(user).values_list('pk', flat=True))
+        cache.set(key, strategy_ids, RECON_CACHE_TIMEOUT)
+    return strategy_ids
+
+
+def bump_recon_version(sender, **kwargs):
+    bump_cache_version(RECON_VERSION_KEY)
+
+
+post_save.connect(bump_recon_version, sender=SubTeam)
+post_delete.connect(bump_recon_version, sender=SubTeam)
+for field in SubTeam._meta.many_to_many:
+    m2m_changed.connect(bump_recon_version, sender=field.remote_field.through)
+# filter_by_recon may read any strategy field, so every edit counts, not only creation.
+post_save.connect(bump_recon_version, sender=Strategy)
+post_delete.connect(bump_recon_version, sender=Strategy)
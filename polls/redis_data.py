@@ -2,21 +2,140 @@ import datetime
 import pytz
 import json
 import logging
+import threading
+import time
+
+from django.conf import settings
+
+from mysite.profiling import record_timing
 
 logging.basicConfig(filename='errors.log', level=logging.ERROR)
 
-def get_from_redis(redis_key):
-    redis_value = ''
+HOLIDAY_TIMEZONE = pytz.timezone('Asia/Kolkata')
+# Upper bound on how stale the holiday set may get within a day, in seconds.
+HOLIDAY_CACHE_TTL = 300
+
+_client = None
+_client_lock = threading.Lock()
+# Stands in for the client once creating it failed, so the failure is logged once rather than on every lookup.
+_NO_CLIENT = object()
+# While a failure is fresh, skip Redis entirely so requests pay the socket timeout once, not every time.
+_unavailable_until = 0.0
+
+
+class InMemoryRedis:
+    """
+    Process-local stand-in for the subset of the redis-py client used here.
+    Selected with REDIS['BACKEND'] = 'memory' or installed directly via set_redis_client().
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _encode(value):
+        return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def mget(self, keys):
+        return [self._data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = self._encode(value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+        return True
+
+
+def _create_client():
+    config = settings.REDIS
+    if config['BACKEND'] == 'memory':
+        return InMemoryRedis()
+    try:
+        import redis
+    except ImportError:
+        logging.error('redis package is not installed, redis lookups will miss')
+        return None
+    pool = redis.ConnectionPool.from_url(
+        config['URL'],
+        max_connections=config['MAX_CONNECTIONS'],
+        socket_timeout=config['SOCKET_TIMEOUT'],
+        socket_connect_timeout=config['SOCKET_CONNECT_TIMEOUT'],
+        health_check_interval=config['HEALTH_CHECK_INTERVAL'],
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+def get_redis_client():
+    """Process-wide client, created lazily on first use. None when Redis is unusable."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client() or _NO_CLIENT
+    return None if _client is _NO_CLIENT else _client
+
+
+def set_redis_client(client):
+    """Swap the process-wide client, e.g. for an InMemoryRedis in tests. None recreates it on next use."""
+    global _client, _unavailable_until
+    with _client_lock:
+        _client = client
+        _unavailable_until = 0.0
+    clear_holiday_cache()
+
+
+def _run(command, *args):
+    global _unavailable_until
+    client = get_redis_client()
+    if client is None or time.monotonic() < _unavailable_until:
+        return None
+    start = time.perf_counter()
+    try:
+        return getattr(client, command)(*args)
+    except Exception as e:
+        _unavailable_until = time.monotonic() + settings.REDIS['RETRY_AFTER']
+        logging.error('Redis ' + command + ' failed: ' + str(e))
+        return None
+    finally:
+        record_timing('redis', time.perf_counter() - start)
+
+
+def _decode(redis_value):
     try:
         if isinstance(redis_value, bytes):
             redis_value = redis_value.decode('utf-8')
     except Exception as e:
         logging.error('Error decoding bytes: ' + str(e))
-    return redis_value
+    return redis_value or ''
 
-def get_jsoned_object(redis_key):
+
+def get_from_redis(redis_key):
+    return _decode(_run('get', redis_key))
+
+
+def get_many_from_redis(redis_keys):
+    """Fetch several keys in one MGET round trip; missing keys come back as ''."""
+    redis_keys = list(redis_keys)
+    if not redis_keys:
+        return []
+    redis_values = _run('mget', redis_keys) or [None] * len(redis_keys)
+    return [_decode(redis_value) for redis_value in redis_values]
+
+
+def _load_json(redis_key, json_value):
     try:
-        json_value = get_from_redis(redis_key)
         if json_value:
             return json.loads(json_value)
         else:
@@ -26,6 +145,44 @@ def get_jsoned_object(redis_key):
         return {}
 
 
+def get_jsoned_object(redis_key):
+    return _load_json(redis_key, get_from_redis(redis_key))
+
+
+def get_jsoned_objects(redis_keys):
+    redis_keys = list(redis_keys)
+    return [_load_json(key, value) for key, value in zip(redis_keys, get_many_from_redis(redis_keys))]
+
+
+# (expires_at timestamp, lowercased emails); replaced wholesale so readers never see a partial entry.
+_holiday_cache = (0.0, frozenset())
+
+
+def get_holiday_date():
+    """Today's date where the holiday sets are kept (HOLIDAY_TIMEZONE)."""
+    return datetime.datetime.now(HOLIDAY_TIMEZONE).date()
+
+
 def get_user_holiday_redis():
-    today = datetime.datetime.now(pytz.timezone('Asia/Kolkata')).date()
-    return get_jsoned_object('today_holiday_users_{}'.format(today))
+    """
+    Lowercased emails of users on holiday today, as a frozenset.
+    Cached per process until HOLIDAY_CACHE_TTL passes or the local date rolls over, whichever is first.
+    """
+    global _holiday_cache
+    expires_at, users_on_holiday = _holiday_cache
+    now = time.time()
+    if now < expires_at:
+        return users_on_holiday
+
+    local_now = datetime.datetime.now(HOLIDAY_TIMEZONE)
+    holidays = get_jsoned_object('today_holiday_users_{}'.format(local_now.date()))
+    users_on_holiday = frozenset(str(email).lower() for email in holidays)
+    next_midnight = HOLIDAY_TIMEZONE.localize(
+        datetime.datetime.combine(local_now.date() + datetime.timedelta(days=1), datetime.time()))
+    _holiday_cache = (min(now + HOLIDAY_CACHE_TTL, next_midnight.timestamp()), users_on_holiday)
+    return users_on_holiday
+
+
+def clear_holiday_cache():
+    global _holiday_cache
+    _holiday_cache = (0.0, frozenset())
@@ -0,0 +1,43 @@
+from functools import cached_property
+
+from .models import User
+
+
+class RequestContext:
+    """
+    The requesting user and their permissions, each looked up at most once per request.
+    Authentication already loads the User, so it is only fetched again when request.user is not a User row.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.request = view.request
+
+    @cached_property
+    def user_id(self):
+        return self.request.user.id
+
+    @cached_property
+    def user(self):
+        if isinstance(self.request.user, User):
+            return self.request.user
+        return User.objects.get(pk=self.user_id)
+
+    @cached_property
+    def is_staff(self):
+        return self.user.is_staff
+
+    @cached_property
+    def user_type(self):
+        return self.view.user_type(self.user)
+
+
+class RequestContextMixin:
+    """Gives a viewset `request_context`, shared by everything handling the same request."""
+
+    @property
+    def request_context(self):
+        context = getattr(self.request, 'polls_context', None)
+        if context is None:
+            context = self.request.polls_context = RequestContext(self)
+        return context
@@ -0,0 +1,71 @@
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+from .models import User, UserProfile, Teams, TeamMembership
+from .team_data import refresh_team_names
+
+DIRECTORY_VERSION_KEY = 'polls:directory_version'
+DIRECTORY_MODELS = (User, UserProfile, Teams, TeamMembership)
+# Fields no directory page or lookup shows; saves limited to them (a login's last_login) leave the version be.
+DIRECTORY_HIDDEN_FIELDS = {User: frozenset({'last_login', 'password'})}
+
+
+def get_cache_version(key):
+    """
+    Current value of a version counter kept in the cache, for building keys that go stale when it is bumped.
+    Seeded from the clock so versions are not reused after the cache is cleared.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Bump a version counter kept in the cache and return its new value."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_cache_version(key)
+
+
+def get_directory_version():
+    """Version of the user directory data, bumped whenever a directory model changes."""
+    return get_cache_version(DIRECTORY_VERSION_KEY)
+
+
+def sync_member_team_names(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_team_names([instance.user_id])
+
+
+def sync_profile_team_names(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        refresh_team_names([instance.user_id])
+
+
+def sync_team_member_names(sender, instance, created, raw=False, **kwargs):
+    # A new team has no members yet; an updated one may have been renamed.
+    if not created and not raw:
+        refresh_team_names(TeamMembership.objects.filter(team=instance).values('user_id'))
+
+
+# Connected ahead of the version bump so a re-rendered page never reads stale team_names.
+post_save.connect(sync_member_team_names, sender=TeamMembership)
+post_delete.connect(sync_member_team_names, sender=TeamMembership)
+post_save.connect(sync_profile_team_names, sender=UserProfile)
+post_save.connect(sync_team_member_names, sender=Teams)
+
+
+def bump_directory_version(sender, update_fields=None, **kwargs):
+    if update_fields and update_fields <= DIRECTORY_HIDDEN_FIELDS.get(sender, frozenset()):
+        return
+    bump_cache_version(DIRECTORY_VERSION_KEY)
+
+
+for model in DIRECTORY_MODELS:
+    post_save.connect(bump_directory_version, sender=model)
+    post_delete.connect(bump_directory_version, sender=model)
@@ -0,0 +1,47 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.pagination import CursorPagination
+from rest_framework.serializers import BaseSerializer, SerializerMethodField
+
+
+class StrategyCursorPagination(CursorPagination):
+    ordering = 'pk'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def add_page_info(self, data):
+        return {'results': data, 'next': self.get_next_link(), 'previous': self.get_previous_link()}
+
+
+def restrict_to_fields(queryset, serializer_fields):
+    """
+    Narrow the queryset to what the given serializer fields read: only() their columns, select_related the
+    foreign keys they traverse and prefetch_related the sets they list. The queryset is returned unchanged
+    if any field reads something the model does not describe, such as a method field or a property.
+    """
+    opts = queryset.model._meta
+    only, select_related, prefetch_related = {opts.pk.name}, set(), set()
+    for field in serializer_fields.values():
+        if isinstance(field, SerializerMethodField) or field.source == '*':
+            return queryset
+        path = field.source.split('.')
+        try:
+            model_field = opts.get_field(path[0])
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch_related.add(model_field.name)
+        elif model_field.is_relation and not model_field.concrete:
+            select_related.add(model_field.name)
+        elif model_field.is_relation:
+            only.add(model_field.name)
+            if len(path) > 1 or isinstance(field, BaseSerializer):
+                select_related.add(model_field.name)
+        else:
+            only.add(model_field.name)
+    if select_related:
+        # only() would otherwise defer every column of the joined models.
+        only.update(f'{name}__{related_field.name}'
+                    for name in select_related
+                    for related_field in opts.get_field(name).related_model._meta.concrete_fields)
+    return queryset.only(*only).select_related(*select_related).prefetch_related(*prefetch_related)
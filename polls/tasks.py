@@ -0,0 +1,27 @@
+from celery import shared_task
+
+from automater.common_utility import get_standard_logger
+from automate.backend_utilities import copy_process_utility
+from automate.models import Strategy
+
+from .models import CopyJobTarget
+
+logger = get_standard_logger(__name__, 'automate_backend.logs')
+
+
+@shared_task
+def copy_process_target(target_id):
+    """Copy a copy job's source strategy onto one of its targets, recording the outcome on the target."""
+    target = CopyJobTarget.objects.select_related('job__user').get(pk=target_id)
+    CopyJobTarget.objects.filter(pk=target_id).update(status='running')
+    job = target.job
+    request_data = {**job.request_data, 'new_name': target.new_name, 'new_box': target.new_box}
+    try:
+        source = Strategy.objects.get(pk=job.source_id)
+        # copy_process_utility turns the object it is given into the new process.
+        status, data = copy_process_utility(source, job.user, request_data=request_data)
+        target.status, target.data = ('done' if status else 'failed'), data
+    except Exception as e:
+        logger.exception(f'Copy job {job.pk} failed for target {target.new_name}')
+        target.status, target.data = 'failed', {'error': str(e)}
+    target.save(update_fields=['status', 'data', 'modified_date'])
@@ -0,0 +1,46 @@
+from collections import defaultdict
+
+from .models import TeamMembership, UserProfile
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def get_user_teams_map(users=None):
+    """
+    Map user id -> comma separated team names, built from a single membership scan.
+    `users` may be a list of user ids or a queryset yielding user ids (used as a subquery).
+    """
+    memberships = TeamMembership.objects.all()
+    if users is not None:
+        memberships = memberships.filter(user_id__in=users)
+    teams = defaultdict(list)
+    for user_id, team_name in memberships.order_by('id').values_list('user_id', 'team__name'):
+        teams[user_id].append(team_name)
+    return {user_id: ', '.join(names) for user_id, names in teams.items()}
+
+
+def refresh_team_names(users):
+    """
+    Recompute UserProfile.team_names for the given users, writing only the rows that changed.
+    `users` takes the same forms as in get_user_teams_map. Returns the number of updated profiles.
+    """
+    teams_map = get_user_teams_map(users)
+    changed = []
+    for profile in UserProfile.objects.filter(user_id__in=users).only('id', 'user_id', 'team_names'):
+        team_names = teams_map.get(profile.user_id, '')
+        if profile.team_names != team_names:
+            profile.team_names = team_names
+            changed.append(profile)
+    UserProfile.objects.bulk_update(changed, ['team_names'], batch_size=BACKFILL_BATCH_SIZE)
+    return len(changed)
+
+
+def backfill_team_names(batch_size=BACKFILL_BATCH_SIZE):
+    """Refresh team_names for every profile, batch_size profiles at a time. Yields (profiles seen, updated)."""
+    last_id = 0
+    while True:
+        batch = list(UserProfile.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'user_id')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield len(batch), refresh_team_names([user_id for _, user_id in batch])
@@ -1,3 +1,474 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Model
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mysite.middleware import DatabaseRoutingMiddleware, ProfilingMiddleware
+from mysite.routers import ReplicaRouter, RequestRouting, allow_replica_reads, current_routing
+
+from . import redis_data
+from .benchmarks import compare_to_baseline, run_benchmarks, seed_directory
+from .directory_io import import_records
+from .models import User, UserProfile, Teams, TeamMembership
+from .signals import get_directory_version
+from .team_data import get_user_teams_map
+from .views import directory_profiles, user_list_profiles
+
+
+# Keep the sampled request profiler out of tests unless a test opts in.
+no_profiling = override_settings(PROFILING={'SAMPLE_RATE': 0, 'LOG_FILE': os.devnull})
+# Replicas mirror the test database, but a second connection to in-memory SQLite cannot read through the
+# test's open transaction; routing itself is covered by ReplicaRouterTests.
+no_replicas = override_settings(REPLICA_DATABASES=[])
+
+
+def setUpModule():
+    no_profiling.enable()
+    no_replicas.enable()
+    redis_data.set_redis_client(redis_data.InMemoryRedis())
+
+
+def tearDownModule():
+    redis_data.set_redis_client(None)
+    no_replicas.disable()
+    no_profiling.disable()
+
+
+class DirectoryTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        redis_data.clear_holiday_cache()
+
+
+def create_profiles(count, teams, prefix='user'):
+    profiles = []
+    for i in range(count):
+        user = User.objects.create(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com')
+        for team in teams:
+            TeamMembership.objects.create(user=user, team=team)
+        profiles.append(UserProfile.objects.create(user=user))
+    return profiles
+
+
+class UserTeamsTests(DirectoryTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teams = [Teams.objects.create(name='alpha'), Teams.objects.create(name='beta')]
+
+    def test_teams_map(self):
+        create_profiles(2, self.teams)
+        loner = User.objects.create(username='loner')
+        teams_map = get_user_teams_map()
+        self.assertEqual(len(teams_map), 2)
+        self.assertEqual(set(teams_map.values()), {'alpha, beta'})
+        self.assertNotIn(loner.id, teams_map)
+
+    def test_team_names_follow_memberships_and_renames(self):
+        profile, = create_profiles(1, self.teams[:1])
+        profile.refresh_from_db()
+        self.assertEqual(profile.team_names, 'alpha')
+
+        membership = TeamMembership.objects.create(user=profile.user, team=self.teams[1])
+        self.teams[1].name = 'gamma'
+        self.teams[1].save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.team_names, 'alpha, gamma')
+
+        membership.delete()
+        profile.refresh_from_db()
+        self.assertEqual(profile.team_names, 'alpha')
+
+    def test_backfill_team_names(self):
+        create_profiles(3, self.teams)
+        UserProfile.objects.update(team_names='')
+        call_command('backfill_team_names', batch_size=2, stdout=StringIO())
+        self.assertEqual(set(UserProfile.objects.values_list('team_names', flat=True)), {'alpha, beta'})
+
+    def test_users_page_query_count_is_constant(self):
+        create_profiles(2, self.teams, prefix='small')
+        with CaptureQueriesContext(connection) as small:
+            response = self.client.get(reverse('users'))
+        self.assertContains(response, 'alpha, beta')
+
+        create_profiles(20, self.teams, prefix='large')
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('users'))
+        self.assertEqual(len(small), len(large))
+
+
+class UserDirectoryPagingTests(DirectoryTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_profiles(5, [Teams.objects.create(name='alpha')])
+
+    def test_keyset_pages_cover_all_users(self):
+        response = self.client.get(reverse('users'), {'page_size': 2})
+        self.assertEqual([up.user.username for up in response.context['usps']], ['user0', 'user1'])
+        self.assertEqual(response.context['next_cursor'], 'user1')
+
+        response = self.client.get(reverse('users'), {'page_size': 2, 'after': 'user3'})
+        self.assertEqual([up.user.username for up in response.context['usps']], ['user4'])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_streamed_pages_render_every_row(self):
+        response = self.client.get(reverse('users'), {'stream': 1})
+        content = b''.join(response.streaming_content).decode()
+        self.assertNotIn('<!-- rows -->', content)
+        self.assertEqual(content.count('class="card my-4"'), 5)
+
+        response = self.client.get(reverse('index'), {'stream': 1})
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content.count('<tr>'), 6)
+
+
+class AsyncDirectoryTests(DirectoryTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_profiles(3, [Teams.objects.create(name='alpha')])
+
+    async def test_async_pages_match_sync_pages(self):
+        for sync_name, async_name in (('users', 'users_async'), ('index', 'index_async')):
+            for params in ({}, {'page_size': 2}):
+                sync_response = await self.async_client.get(reverse(sync_name), params)
+                async_response = await self.async_client.get(reverse(async_name), params)
+                self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_async_users_page_marks_holidays_and_streams(self):
+        key = 'today_holiday_users_{}'.format(datetime.datetime.now(redis_data.HOLIDAY_TIMEZONE).date())
+        redis_data.get_redis_client().set(key, json.dumps(['User1@example.com']))
+        self.addCleanup(redis_data.get_redis_client().delete, key)
+        response = await self.async_client.get(reverse('users_async'))
+        self.assertContains(response, 'On Holiday', count=1)
+
+        response = await self.async_client.get(reverse('users_async'), {'stream': 1})
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content.count('class="card my-4"'), 3)
+        self.assertEqual(content.count('On Holiday'), 1)
+
+
+class RedisDataTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(redis_data.set_redis_client, redis_data.get_redis_client())
+        self.redis = redis_data.InMemoryRedis()
+        redis_data.set_redis_client(self.redis)
+
+    def test_jsoned_objects(self):
+        self.redis.set('a', json.dumps({'x': 1}))
+        self.redis.set('broken', '{')
+        self.assertEqual(redis_data.get_jsoned_object('a'), {'x': 1})
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(redis_data.get_jsoned_objects(['a', 'missing', 'broken']), [{'x': 1}, {}, {}])
+
+    def test_holiday_set_is_cached_lowercased(self):
+        key = 'today_holiday_users_{}'.format(datetime.datetime.now(redis_data.HOLIDAY_TIMEZONE).date())
+        self.redis.set(key, json.dumps(['Someone@Example.com']))
+        self.assertEqual(redis_data.get_user_holiday_redis(), frozenset({'someone@example.com'}))
+
+        self.redis.set(key, json.dumps([]))
+        self.assertEqual(redis_data.get_user_holiday_redis(), frozenset({'someone@example.com'}))
+        with mock.patch('polls.redis_data.time.time', return_value=time.time() + 86400):
+            self.assertEqual(redis_data.get_user_holiday_redis(), frozenset())
+
+    def test_missing_redis_package_is_logged_once(self):
+        redis_data.set_redis_client(None)
+        with override_settings(REDIS={**settings.REDIS, 'BACKEND': 'redis'}), \
+                mock.patch.dict('sys.modules', {'redis': None}), self.assertLogs(level='ERROR') as logs:
+            for _ in range(3):
+                self.assertEqual(redis_data.get_from_redis('a'), '')
+        self.assertEqual(len(logs.output), 1)
+
+    def test_failure_degrades_to_miss(self):
+        class DownRedis:
+            calls = 0
+
+            def get(self, key):
+                DownRedis.calls += 1
+                raise ConnectionError('down')
+
+        redis_data.set_redis_client(DownRedis())
+        with self.assertLogs(level='ERROR'):
+            self.assertEqual(redis_data.get_from_redis('a'), '')
+        self.assertEqual(redis_data.get_from_redis('a'), '')
+        self.assertEqual(DownRedis.calls, 1)
+
+
+class UsersLookupTests(DirectoryTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_profiles(3, [Teams.objects.create(name='alpha')])
+
+    def test_lookup_by_params_and_body(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('users_lookup'), {'users': ['user0', 'user1,missing']})
+        self.assertEqual([row['username'] for row in response.json()['users']], ['user0', 'user1'])
+        self.assertEqual(response.json()['users'][0]['teams'], 'alpha')
+
+        response = self.client.post(reverse('users_lookup'), {'users': ['user2']}, content_type='application/json')
+        self.assertEqual(response.json()['users'][0]['email'], 'user2@example.com')
+
+    def test_malformed_body_is_rejected(self):
+        for body in ('{', '[]', '{"users": "user0"}', '{"users": 5}', '{"users": [1]}'):
+            with self.assertLogs('django.request', 'WARNING'):
+                response = self.client.post(reverse('users_lookup'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_etag_skips_unchanged_results(self):
+        response = self.client.get(reverse('users_lookup'), {'users': 'user0'})
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('users_lookup'), {'users': 'user0'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get(reverse('users_lookup'), {'users': 'user1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        team = Teams.objects.get(name='alpha')
+        team.name = 'renamed'
+        team.save()
+        response = self.client.get(reverse('users_lookup'), {'users': 'user0'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['users'][0]['teams'], 'renamed')
+
+
+class DirectoryPageCacheTests(DirectoryTestCase):
+
+    def test_pages_are_cached_until_directory_changes(self):
+        team = Teams.objects.create(name='alpha')
+        create_profiles(2, [team])
+        self.client.get(reverse('users'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('users'))
+        self.assertContains(response, 'user1@example.com')
+
+        response = self.client.get(reverse('users'), {'page_size': 1})
+        self.assertNotContains(response, 'user1@example.com')
+
+        team.name = 'renamed'
+        team.save()
+        self.assertContains(self.client.get(reverse('users')), 'renamed')
+
+    def test_pages_are_not_served_after_local_midnight(self):
+        create_profiles(1, [])
+        self.client.get(reverse('users'))
+        tomorrow = redis_data.get_holiday_date() + datetime.timedelta(days=1)
+        with mock.patch('polls.page_cache.get_holiday_date', return_value=tomorrow), self.assertNumQueries(1):
+            self.client.get(reverse('users'))
+
+    def test_logins_keep_cached_pages(self):
+        profile, = create_profiles(1, [])
+        version = get_directory_version()
+        update_last_login(None, profile.user)
+        self.assertEqual(get_directory_version(), version)
+        profile.user.save(update_fields=['email', 'last_login'])
+        self.assertNotEqual(get_directory_version(), version)
+
+
+class DirectoryQueryPlanTests(TestCase):
+
+    def test_directory_queries_avoid_full_scans(self):
+        call_command('explain_directory_queries', stdout=StringIO())
+
+
+class DirectoryProjectionTests(DirectoryTestCase):
+
+    def test_templates_only_read_projected_fields(self):
+        create_profiles(2, [Teams.objects.create(name='alpha')])
+        # Reading a deferred field reloads it through refresh_from_db, one query per row.
+        with mock.patch.object(Model, 'refresh_from_db', side_effect=AssertionError('deferred field read')):
+            render_to_string('user_rows.html', {'users': user_list_profiles()})
+            cards = render_to_string('user_cards.html', {
+                'usps': directory_profiles(),
+                'user_profile': {'is_internal': True},
+                'users_on_holiday': frozenset(),
+            })
+            self.client.get(reverse('index'))
+            self.client.get(reverse('users'))
+        self.assertIn('alpha', cards)
+
+
+class DatabaseProfileTests(TestCase):
+
+    def test_production_pragmas_apply_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as db_dir:
+            connections.settings['pragmas'] = {
+                **connection.settings_dict, **settings.SQLITE_PRODUCTION, 'NAME': os.path.join(db_dir, 'db')}
+            try:
+                with connections['pragmas'].cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                connections['pragmas'].close()
+                del connections['pragmas']
+                del connections.settings['pragmas']
+        # synchronous is reported as a number: 1 is NORMAL.
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000})
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        token = current_routing.set(RequestRouting())
+        self.addCleanup(current_routing.reset, token)
+
+    def test_directory_reads_use_replicas_until_a_write(self):
+        self.assertEqual(self.router.db_for_read(UserProfile), 'replica_1')
+        self.assertIsNone(self.router.db_for_read(User))
+        allow_replica_reads()
+        self.assertEqual(self.router.db_for_read(User), 'replica_1')
+
+        self.assertEqual(self.router.db_for_write(Teams), 'default')
+        self.assertIsNone(self.router.db_for_read(UserProfile))
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_cached_directory_pages_are_rendered_from_the_primary(self):
+        cache.clear()
+        routed = []
+        with mock.patch.object(ReplicaRouter, 'db_for_read',
+                               lambda router, model, **hints: routed.append(current_routing.get().pinned)):
+            self.client.get(reverse('users'))
+        self.assertTrue(routed)
+        self.assertTrue(all(routed))
+
+    def test_outside_requests_everything_uses_the_primary(self):
+        current_routing.set(None)
+        self.assertIsNone(self.router.db_for_read(UserProfile))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'polls'))
+
+
+class BenchmarkSuiteTests(DirectoryTestCase):
+
+    def test_seeded_scenarios_are_measured_and_compared(self):
+        seed_directory(users=5, teams=2, teams_per_user=2, batch_size=2)
+        for team_names in UserProfile.objects.values_list('team_names', flat=True):
+            self.assertEqual(sorted(team_names.split(', ')), ['bench-team-0', 'bench-team-1'])
+
+        results = run_benchmarks(2, names=['users_page'])
+        self.assertEqual(list(results), ['users_page'])
+        self.assertEqual(results['users_page']['queries'], 1)
+
+        baseline = {'users_page': {**results['users_page'], 'queries': 0.5}}
+        self.assertEqual(compare_to_baseline(results, baseline), [('users_page', 'queries', 0.5, 1)])
+
+
+class DirectoryTransferTests(DirectoryTestCase):
+
+    def test_export_import_round_trip(self):
+        alpha = Teams.objects.create(name='alpha', email='alpha@example.com')
+        profile, = create_profiles(1, [alpha])
+        UserProfile.objects.filter(pk=profile.pk).update(
+            box_username='box0', primary_team=alpha, doj=datetime.date(2024, 1, 2), is_internal=True)
+        with tempfile.TemporaryDirectory() as transfer_dir:
+            for kind, file_name in (('teams', 'teams.jsonl'), ('memberships', 'm.csv'), ('profiles', 'p.csv')):
+                call_command('export_directory', kind, os.path.join(transfer_dir, file_name), stdout=StringIO())
+            TeamMembership.objects.all().delete()
+            UserProfile.objects.all().delete()
+            alpha.delete()
+            version = get_directory_version()
+            for kind, file_name in (('teams', 'teams.jsonl'), ('memberships', 'm.csv'), ('profiles', 'p.csv')):
+                call_command('import_directory', kind, os.path.join(transfer_dir, file_name), stdout=StringIO())
+
+        self.assertNotEqual(get_directory_version(), version)
+        self.assertEqual(Teams.objects.get().email, 'alpha@example.com')
+        self.assertEqual(list(UserProfile.objects.values_list(
+            'user__username', 'box_username', 'primary_team__name', 'doj', 'is_internal', 'team_names')),
+            [('user0', 'box0', 'alpha', datetime.date(2024, 1, 2), True, 'alpha')])
+
+    def test_conflicts_are_updated_or_skipped(self):
+        Teams.objects.create(name='alpha', email='old@example.com')
+        create_profiles(2, [])
+        UserProfile.objects.filter(user__username='user0').update(box_username='box0')
+        with tempfile.TemporaryDirectory() as transfer_dir:
+            teams = os.path.join(transfer_dir, 'teams.csv')
+            with open(teams, 'w') as f:
+                f.write('name,email\nalpha,new@example.com\nbeta,\n')
+            call_command('import_directory', 'teams', teams, on_conflict='skip', stdout=StringIO())
+            self.assertEqual(Teams.objects.get(name='alpha').email, 'old@example.com')
+            call_command('import_directory', 'teams', teams, batch_size=1, stdout=StringIO())
+            self.assertEqual(Teams.objects.get(name='alpha').email, 'new@example.com')
+
+            profiles = os.path.join(transfer_dir, 'profiles.jsonl')
+            with open(profiles, 'w') as f:
+                f.write('{"username": "user1", "box_username": "box0"}\n{"username": "missing"}\n{"username\n[]\n'
+                        '{"username": "user0", "doj": "2024-01-02"}\n')
+            stderr = StringIO()
+            call_command('import_directory', 'profiles', profiles, stdout=StringIO(), stderr=stderr)
+        self.assertIn('belongs to another user', stderr.getvalue())
+        self.assertIn('unknown user', stderr.getvalue())
+        self.assertIn('line 3:', stderr.getvalue())
+        self.assertIn('line 4: not a JSON object', stderr.getvalue())
+        self.assertEqual(UserProfile.objects.get(user__username='user0').doj, datetime.date(2024, 1, 2))
+        self.assertIsNone(UserProfile.objects.get(user__username='user1').box_username)
+
+    def test_mixed_column_records_keep_the_columns_they_lack(self):
+        Teams.objects.create(name='alpha', team_type='external', email='alpha@example.com')
+        Teams.objects.create(name='beta', team_type='external', email='beta@example.com')
+        for profile in create_profiles(2, []):
+            profile.box_username = f'{profile.user.username}-box'
+            profile.doj = datetime.date(2020, 1, 1)
+            profile.save()
+        for _ in import_records('teams', [{'name': 'alpha', 'email': 'new@example.com'},
+                                          {'name': 'beta', 'team_type': 'internal'}]):
+            pass
+        for _ in import_records('profiles', [{'username': 'user0', 'doj': '2024-05-05'},
+                                             {'username': 'user1', 'box_username': 'user1-new'}]):
+            pass
+
+        self.assertEqual(list(Teams.objects.order_by('name').values_list('name', 'team_type', 'email')),
+                         [('alpha', 'external', 'new@example.com'), ('beta', 'internal', 'beta@example.com')])
+        self.assertEqual(list(UserProfile.objects.order_by('user__username').values_list('box_username', 'doj')),
+                         [('user0-box', datetime.date(2024, 5, 5)), ('user1-new', datetime.date(2020, 1, 1))])
+
+
+class ProfilingMiddlewareTests(DirectoryTestCase):
+
+    def test_sampled_request_is_timed_and_logged(self):
+        create_profiles(1, [Teams.objects.create(name='alpha')])
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = os.path.join(log_dir, 'profiling.jsonl')
+            with override_settings(PROFILING={'SAMPLE_RATE': 1, 'LOG_FILE': log_file}):
+                response = self.client.get(reverse('users'))
+            with open(log_file) as f:
+                entry = json.loads(f.read())
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ calls"')
+        self.assertIn('template;dur=', response['Server-Timing'])
+        self.assertEqual(entry['path'], reverse('users'))
+        self.assertEqual(entry['redis_calls'], 1)
+        self.assertGreater(entry['db_calls'], 0)
+
+    def test_unsampled_request_is_untouched(self):
+        response = self.client.get(reverse('users'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_templates_are_patched_only_by_profiling_middleware_with_profiling_on(self):
+        with mock.patch('mysite.middleware.install_template_timer') as install_template_timer:
+            ProfilingMiddleware(lambda request: None)
+            install_template_timer.assert_not_called()
+            with override_settings(PROFILING={'SAMPLE_RATE': 1, 'LOG_FILE': os.devnull}):
+                DatabaseRoutingMiddleware(lambda request: None)
+                install_template_timer.assert_not_called()
+                ProfilingMiddleware(lambda request: None)
+        install_template_timer.assert_called_once_with()
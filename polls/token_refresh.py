@@ -0,0 +1,72 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# How long a refresh result is reused for the same refresh token. This also bounds how long a logout
+# can go unnoticed by a client that refreshed just before it.
+REFRESH_RESULT_TTL = 5
+MAX_CACHED_RESULTS = 10000
+MAX_REVOKED_TOKENS = 100000
+
+
+def token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+
+class RefreshCoalescer:
+    """
+    Runs the refresh of a given token at most once at a time per process and reuses its result for
+    REFRESH_RESULT_TTL seconds, so a burst of identical refreshes costs one denylist lookup and one
+    signature verification. Tokens found revoked are remembered exactly, as revocation is permanent.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._inflight = {}
+        self._revoked = set()
+
+    def is_revoked(self, token):
+        return token_hash(token) in self._revoked
+
+    def mark_revoked(self, token):
+        with self._lock:
+            if len(self._revoked) >= MAX_REVOKED_TOKENS:
+                self._revoked.clear()
+            self._revoked.add(token_hash(token))
+
+    def run(self, token, refresh):
+        """Result of refresh() for the token, shared with concurrent and recent callers for the same token."""
+        key = token_hash(token)
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            result = refresh()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        with self._lock:
+            self._results[key] = (time.monotonic() + REFRESH_RESULT_TTL, result)
+            self._results.move_to_end(key)
+            while len(self._results) > MAX_CACHED_RESULTS:
+                self._results.popitem(last=False)
+        return result
+
+
+refresh_coalescer = RefreshCoalescer()
@@ -5,4 +5,8 @@ from . import views
 urlpatterns = [
     path("", views.user_list, name="index"),
     path("users", views.users, name="users"),
-]
\ No newline at end of file
+    path("users/lookup", views.users_lookup, name="users_lookup"),
+    # Async versions of the directory pages, for deployments served over ASGI.
+    path("async/", views.user_list_async, name="index_async"),
+    path("async/users", views.users_async, name="users_async"),
+]
@@ -1,61 +1,278 @@
+import asyncio
+import hashlib
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import resolve
+from django.utils.http import parse_etags
 from django.core import serializers
-from .models import User, UserProfile, TeamMembership
+from django.core.serializers.json import DjangoJSONEncoder
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from .models import User, UserProfile
 from . import redis_data
+from .page_cache import cache_directory_page
+from .signals import get_directory_version
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+STREAM_MARKER = '<!-- rows -->'
+MAX_LOOKUP_USERS = 1000
+DEFAULT_IMAGE_LOCATION = '/static/img/profile/default.jpg'
+
+# Columns read by user_rows.html and user_cards.html; anything else stays deferred.
+USER_LIST_FIELDS = ('image_location', 'user__username', 'user__email', 'user__first_name', 'user__last_name',
+                    'user__date_joined')
+USERS_FIELDS = ('doj', 'team_names', 'user__username', 'user__email')
 
 
 def index(request):
     return HttpResponse("Hello, world. You're at the polls index.")
 
 
+def get_page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size') or PAGE_SIZE)
+    except ValueError:
+        page_size = PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def keyset_paginate(queryset, after, page_size):
+    """
+    Page a UserProfile queryset on user__username without an OFFSET scan.
+    Returns the rows of the page and the cursor for the next one (None on the last page).
+    """
+    return split_page(list(keyset_page(queryset, after, page_size)), page_size)
+
+
+async def akeyset_paginate(queryset, after, page_size):
+    return split_page(await alist(keyset_page(queryset, after, page_size)), page_size)
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def keyset_page(queryset, after, page_size):
+    """The rows of one page plus the first row of the next, if any."""
+    if after:
+        queryset = queryset.filter(user__username__gt=after)
+    return queryset.order_by('user__username')[:page_size + 1]
+
+
+def split_page(rows, page_size):
+    next_cursor = rows[page_size - 1].user.username if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def iter_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    iterator = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+async def aiter_chunks(queryset, chunk_size=STREAM_CHUNK_SIZE):
+    chunk = []
+    async for row in queryset.aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_page(request, template_name, context, rows_template, chunk_contexts):
+    """
+    Stream a page: the page template is rendered once with `stream` set, and the rows
+    rendered from `chunk_contexts` are yielded in place of STREAM_MARKER.
+    `chunk_contexts` may be an async iterable, for async views served over ASGI.
+    """
+    head, tail = render_to_string(template_name, {**context, 'stream': True}, request).split(STREAM_MARKER)
+
+    def content():
+        yield head
+        for chunk_context in chunk_contexts:
+            yield render_to_string(rows_template, {**context, **chunk_context}, request)
+        yield tail
+
+    async def acontent():
+        yield head
+        async for chunk_context in chunk_contexts:
+            yield render_to_string(rows_template, {**context, **chunk_context}, request)
+        yield tail
+
+    return StreamingHttpResponse(acontent() if hasattr(chunk_contexts, '__aiter__') else content())
+
+
+def user_list_profiles():
+    return UserProfile.objects.filter(user__is_active=True).select_related('user').only(
+        *USER_LIST_FIELDS).order_by('user__username')
+
+
+def directory_profiles(is_active=True):
+    return UserProfile.objects.exclude(user__is_active=not is_active).select_related('user').only(
+        *USERS_FIELDS).order_by('user__username')
+
+
+@cache_directory_page
 def user_list(request):
-    users = UserProfile.objects.filter(user__is_active=True).select_related('user')
-    context = {
-        'users': users,
-    }
+    users = user_list_profiles()
+    context = {}
+
+    if request.GET.get('stream'):
+        chunk_contexts = ({'users': chunk} for chunk in iter_chunks(users))
+        return stream_page(request, 'user_list.html', context, 'user_rows.html', chunk_contexts)
+
+    if 'after' in request.GET or 'page_size' in request.GET:
+        users, context['next_cursor'] = keyset_paginate(users, request.GET.get('after'), get_page_size(request))
+
+    context['users'] = users
     return render(request, 'user_list.html', context)
 
 
+@cache_directory_page
+async def user_list_async(request):
+    """user_list for ASGI: the rows are fetched with the async ORM instead of holding a thread."""
+    users = user_list_profiles()
+    context = {}
+
+    if request.GET.get('stream'):
+        chunk_contexts = ({'users': chunk} async for chunk in aiter_chunks(users))
+        return stream_page(request, 'user_list.html', context, 'user_rows.html', chunk_contexts)
+
+    if 'after' in request.GET or 'page_size' in request.GET:
+        users, context['next_cursor'] = await akeyset_paginate(
+            users, request.GET.get('after'), get_page_size(request))
+    else:
+        users = await alist(users)
+
+    context['users'] = users
+    return render(request, 'user_list.html', context)
+
+
+def dumps_json(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def get_requested_usernames(request):
+    """
+    Usernames from a JSON body ({"users": [...]}), form fields or repeated/comma separated `users` params.
+    """
+    if request.method == 'POST' and request.content_type == 'application/json':
+        body = json.loads(request.body or b'{}')
+        usernames = body.get('users', []) if isinstance(body, dict) else None
+        if not isinstance(usernames, list) or not all(isinstance(name, str) for name in usernames):
+            raise ValueError('users must be a list of usernames')
+    else:
+        params = request.POST if request.method == 'POST' else request.GET
+        usernames = [name for value in params.getlist('users') for name in value.split(',')]
+    return sorted({str(name).strip() for name in usernames} - {''})
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def users_lookup(request):
+    """
+    Bulk directory lookup: email, date of joining and teams for each requested username,
+    in one query regardless of how many users are asked for.
+    The ETag hashes the directory version with the requested usernames, so a matching If-None-Match is
+    answered with a 304 before any query. Like the page cache, it needs a shared CACHE_BACKEND to see
+    directory writes made by other workers.
+    """
+    try:
+        usernames = get_requested_usernames(request)
+    except ValueError:
+        return HttpResponseBadRequest('Expected a JSON body like {"users": ["username", ...]}.')
+    if len(usernames) > MAX_LOOKUP_USERS:
+        return HttpResponseBadRequest(f'At most {MAX_LOOKUP_USERS} users can be looked up at once.')
+
+    etag = '"{}"'.format(hashlib.md5('{}:{}'.format(get_directory_version(), ','.join(usernames)).encode()).hexdigest())
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    rows = User.objects.filter(username__in=usernames).order_by('username').values(
+        'username', 'email', 'userprofile__doj', 'userprofile__team_names')
+    data = [{
+        'username': row['username'],
+        'email': row['email'],
+        'teams': row['userprofile__team_names'] or '',
+        'doj': row['userprofile__doj'],
+        'image_location': DEFAULT_IMAGE_LOCATION,
+    } for row in rows]
+
+    response = HttpResponse(dumps_json({'status': True, 'users': data}), content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+@cache_directory_page
 def users(request):
-    users_on_holiday = redis_data.get_user_holiday_redis() or {}
+    users_on_holiday = redis_data.get_user_holiday_redis()
     url_name = resolve(request.path_info).__dict__["url_name"]
-    is_api = request.GET.get('is_api', False) == True
-
-    if is_api:
-        requested_users = request.GET.get('users', '').split(',')
-        users = User.objects.filter(username__in=requested_users).prefetch_related(
-            'teammembership_set', 'userprofile'
-        )
-        data = []
-        for user in users:
-            teams = user.teammembership_set.all().values_list('team__name', flat=True)
-            data.append({
-                'email': user.email,
-                'teams': ', '.join(teams),
-                'doj': user.userprofile.doj,
-                'image_location': '/static/img/profile/default.jpg'
-            })
-        return JsonResponse({'status': True, 'users': data})
 
     if url_name == 'users':
-        usps = UserProfile.objects.exclude(user__is_active=False).order_by('user__username')
+        usps = directory_profiles(is_active=True)
     elif url_name == 'inactive_users':
-        usps = UserProfile.objects.exclude(user__is_active=True).order_by('user__username')
-
-    for up in usps:
-        tms = TeamMembership.objects.filter(user=up.user)
-        teams = []
-        for tm in tms:
-            teams.append(tm.team.name)
-        up.teams = ', '.join(teams)
+        usps = directory_profiles(is_active=False)
 
     context = {
-        'usps': usps,
         'users_on_holiday': users_on_holiday,
  
         'internal':True
     }
 
+    if request.GET.get('stream'):
+        chunk_contexts = ({'usps': chunk} for chunk in iter_chunks(usps))
+        return stream_page(request, 'users.html', context, 'user_cards.html', chunk_contexts)
+
+    if 'after' in request.GET or 'page_size' in request.GET:
+        usps, context['next_cursor'] = keyset_paginate(usps, request.GET.get('after'), get_page_size(request))
+
+    context['usps'] = usps
+    return render(request, 'users.html', context)
+
+
+@cache_directory_page
+async def users_async(request):
+    """
+    users for ASGI: the holiday set is read from Redis on a worker thread while the profiles are fetched
+    with the async ORM, so a request waits for the slower of the two rather than their sum.
+    """
+    get_users_on_holiday = sync_to_async(redis_data.get_user_holiday_redis, thread_sensitive=False)
+    usps = directory_profiles()
+    context = {
+        'internal': True
+    }
+
+    if request.GET.get('stream'):
+        context['users_on_holiday'] = await get_users_on_holiday()
+        chunk_contexts = ({'usps': chunk} async for chunk in aiter_chunks(usps))
+        return stream_page(request, 'users.html', context, 'user_cards.html', chunk_contexts)
+
+    if 'after' in request.GET or 'page_size' in request.GET:
+        rows = akeyset_paginate(usps, request.GET.get('after'), get_page_size(request))
+        context['users_on_holiday'], (usps, context['next_cursor']) = await asyncio.gather(
+            get_users_on_holiday(), rows)
+    else:
+        context['users_on_holiday'], usps = await asyncio.gather(
+            get_users_on_holiday(), alist(usps))
+
+    context['usps'] = usps
     return render(request, 'users.html', context)